@@ -0,0 +1,77 @@
+# Benchmark CLI startup: --help of entry points with and without a cached
+# argument spec, and importing the CLI layer vs. the full library
+# Run with e.g.
+#   python benchmarks/bench_import.py
+import os, sys
+import glob
+import subprocess
+import tempfile
+import time
+
+ROOT_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".."))
+LIB_DIR = os.path.join(ROOT_DIR, "lib")
+DESIGNS_DIR = os.path.join(ROOT_DIR, "designs")
+ENV = dict(os.environ, PYTHONPATH=LIB_DIR)
+# Modules run with -m import their packages, which are lazy so that
+# fast_help still runs before build123d is imported. The design files do
+# not use fast_help, they show the cost of importing build123d.
+# iFiDACMount has no CLI, so it is timed making and exporting the model
+ENTRY_POINTS = (
+    [os.path.join(LIB_DIR, "print_parts", "BoardSnapClip.py")],
+    ["-W", "ignore", "-m", "print_parts.enclosures.SnapClipBoardStandoff"],
+    ["-W", "ignore", "-m", "print_parts.enclosures.SnapClipBoardEnclosure"],
+    [os.path.join(DESIGNS_DIR, "Rack", "Panel.py")],
+    [os.path.join(DESIGNS_DIR, "Rack", "DIY8Inch", "iFiDACMount.py")],
+)
+IMPORTS = ("cad_cli", "bd_common")
+REPEAT = 3
+
+
+def run_time(args, cwd, setup=None):
+    """Best time of running python with args, None if it fails"""
+    best = None
+    for _ in range(REPEAT):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=cwd, env=ENV,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def clear_specs():
+    for d in (LIB_DIR, DESIGNS_DIR):
+        for fn in glob.glob(os.path.join(d, "**", "*.cli-spec.json"),
+                            recursive=True):
+            os.remove(fn)
+
+
+def _fmt(t, width):
+    return f"{'failed':>{width}}" if t is None else f"{t:>{width}.3f}"
+
+
+def main():
+    # Outputs of design files go to a scratch directory
+    with tempfile.TemporaryDirectory() as cwd:
+        print(f"{'entry point':>58} {'cold (s)':>9} {'cached (s)':>11}")
+        for entry in ENTRY_POINTS:
+            cold = run_time(entry + ["--help"], cwd, setup=clear_specs)
+            cached = run_time(entry + ["--help"], cwd)
+            name = " ".join(os.path.relpath(a, ROOT_DIR) if os.path.isabs(a)
+                            else a for a in entry)
+            print(f"{name:>58} {_fmt(cold, 9)} {_fmt(cached, 11)}")
+        print()
+        print(f"{'import':>58} {'time (s)':>9}")
+        for module in IMPORTS:
+            t = run_time(['-c', f'import {module}'], cwd)
+            print(f"{module:>58} {_fmt(t, 9)}")
+
+
+if __name__ == "__main__":
+    main()
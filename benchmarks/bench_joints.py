@@ -0,0 +1,51 @@
+# Benchmark batched vs. per-instance booleans in StraightEdgeJoint.join
+# Run with PYTHONPATH including lib/, e.g.
+#   PYTHONPATH=lib python benchmarks/bench_joints.py
+from build123d import *
+from bd_common import *
+from bd_lc import LCBoard
+import time
+
+FINGER_COUNTS = (2, 4, 8, 16, 32)
+REPEAT = 5
+
+
+def best_time(func, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_boards(count):
+    length = 20.0 * count
+    base = LCBoard(board_sk=Rectangle(length, 50), thickness=3)
+    target = LCBoard(board_sk=Rectangle(length, 30), thickness=3)
+    target = Pos(Y=-25 - 1.5) * Rot(X=90) * target
+    joint = StraightFingerJoint(length / (count * 2), 3, 3, 0.1, 0.1)
+    plane = Plane(base.faces().sort_by(Axis.Y).first, x_dir=(1, 0, 0))
+    return base, target, joint, plane, length
+
+
+def join_boards(boards, count, batched):
+    base, target, joint, plane, length = boards
+    return joint.join(base, target, plane, count, spread=length,
+                      batched=batched)
+
+
+def main():
+    print(f"{'fingers':>8} {'list (s)':>10} {'batched (s)':>12} {'speedup':>8}")
+    for count in FINGER_COUNTS:
+        boards = make_boards(count)
+        t_list, (m_list, f_list) = best_time(lambda: join_boards(boards, count, False))
+        t_batch, (m_batch, f_batch) = best_time(lambda: join_boards(boards, count, True))
+        assert rdeq(m_list.volume, m_batch.volume) and \
+            rdeq(f_list.volume, f_batch.volume), "Batched join geometry differs"
+        print(f"{count:>8} {t_list:>10.4f} {t_batch:>12.4f} {t_list/t_batch:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+# Benchmark suite over library parts, example designs and export paths.
+# Every case runs in a forked process, reporting its best time and peak
+# memory increase, and is compared against a saved baseline, failing on
+# regressions beyond the tolerance.
+# Run with PYTHONPATH including lib/, e.g.
+#   PYTHONPATH=lib python benchmarks/bench_suite.py --save   # record baseline
+#   PYTHONPATH=lib python benchmarks/bench_suite.py          # compare to it
+from build123d import *
+from bd_common import *
+from bd_lc import *
+from bd_pattern import grid_centers, fill_centers, perforate
+from bd_flat import flat_profile
+from bd_nest import nest_boards
+from build123d import exporters3d
+import bd_cache
+from cad_common import IN
+from print_parts.BoardSnapClip import BoardSnapClip
+from print_parts.enclosures import SnapClipBoardStandoff, SnapClipBoardEnclosure
+from utils import import_from_file
+from dataclasses import dataclass
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+import multiprocessing
+import resource
+import tempfile
+import json
+import math
+import time
+import os, sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DESIGNS_DIR = os.path.join(BENCH_DIR, "..", "designs")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+Panel = import_from_file(os.path.join(DESIGNS_DIR, "Rack", "Panel.py"))
+RackPanel, ModularPanel = Panel.RackPanel, Panel.ModularPanel
+
+# Differences below these are noise, not regressions
+MIN_TIME_DIFF = 0.01
+MIN_MEMORY_DIFF = 8 * 1024 * 1024
+
+
+@dataclass(kw_only=True)
+class PegBoard(CommonJoinedPart):
+    """Plate with count x count alternating pegs and holes"""
+    count: int = 8
+
+    def make(self):
+        size = 10 * self.count
+        positive = [Box(size, size, 2)]
+        negative = []
+        for i, loc in enumerate(GridLocations(10, 10, self.count, self.count)):
+            if (i + i // self.count) % 2:
+                positive.append(loc * Pos(Z=2) * Cylinder(3, 4))
+            else:
+                negative.append(loc * Cylinder(2, 4))
+        return positive, negative
+
+
+def ifidac_mount(scale=1):
+    """LCBuilder flow of designs/Rack/DIY8Inch/iFiDACMount.py, with tray
+    dimensions multiplied by scale"""
+    return ifidac_builder(scale)[0].make_assembly()
+
+
+def ifidac_builder(scale=1):
+    """Builder of ifidac_mount, and its boards by name"""
+    thickness = 1 / 8 * IN
+    height = 1.75 * IN
+    tray_width = 6.5 * IN * scale
+    tray_depth = 4 * IN * scale
+    back_height = 0.5 * IN
+    front_hole_offset = 5 + thickness - height / 2
+
+    panel_sk = RackPanel(widthIn=8 * scale)
+    front_hole = Rectangle(5.5 * IN * scale, 28)
+    front_hole = anchor(front_hole, FRONT)
+    front_hole = Location((0, front_hole_offset, 0)) * front_hole
+    panel_sk -= front_hole
+
+    builder = LCBuilder(
+        default_thickness=thickness,
+        default_connect_type=LCConnect.TO_BASE,
+        default_joint_config=6,
+        auto_thickness_tolerance=0.1,
+        auto_width_tolerance=0.1)
+    bottom = builder.add_board(Rectangle(tray_width, tray_depth + thickness))
+    panel = builder.add_board(Rot(Z=-90) * panel_sk, angle=-90,
+                              connect_type=LCConnect.FROM_BASE)
+    builder.add_board(Rot(Z=-90) * Rectangle(tray_width, back_height),
+                      angle=90, base_board=bottom)
+    side_sk = Polygon((0, 0), (height - thickness, 0),
+                      (back_height, tray_depth), (0, tray_depth))
+    side_right = builder.add_board(side_sk, base_board=bottom,
+                                   connect_anchor_modifier=FRONT,
+                                   joint_config=4)
+    side_left = builder.add_board(side_sk.mirror(Plane.XZ), base_board=bottom,
+                                  angle=180, connect_anchor_modifier=BACK,
+                                  joint_config=4)
+    builder.join_inplace(side_right, panel, 2)
+    builder.join_inplace(side_left, panel, 2)
+    builder.add_part(
+        lambda panel: panel.unjoined_board_synced.moved(Pos(Y=-panel.thickness)),
+        depends_on=[panel])
+    return builder, {"bottom": bottom, "panel": panel,
+                     "side_right": side_right, "side_left": side_left}
+
+
+def export_case(export, make):
+    """Case running export(obj, fn) on an object made before timing"""
+    def setup():
+        obj = make()
+        out_dir = tempfile.mkdtemp(prefix="bench_suite_")
+        return lambda: export(obj, os.path.join(out_dir, "out"))
+    return setup
+
+
+def cases():
+    """Returns {name: setup}, setup returns the function to time"""
+    c = {}
+    for trap_type in NutTrapType:
+        for mask in (True, False):
+            for width in (10, 40):
+                c[f"NutTrap[{trap_type.name},mask={mask},width={width}]"] = \
+                    lambda t=trap_type, m=mask, w=width: \
+                    lambda: NutTrap(trap_type=t, floating_mask=m, width=w)
+    for count in (20, 80):
+        c[f"nut_traps+screw_holes[count={count}]"] = lambda n=count: lambda: \
+            cut_tools(Box(12 * n, 40, 10),
+                      nut_traps(GridLocations(12, 20, n // 2, 2)),
+                      screw_holes(GridLocations(12, 20, n // 2, 2),
+                                  head_type=ScrewHeadType.COUNTERSINK))
+    for count in (100, 1000, 10000):
+        side = math.ceil(math.sqrt(count))
+        c[f"perforate[2d,holes={side * side}]"] = lambda n=side: lambda: \
+            perforate(Rectangle(4 * n + 4, 4 * n + 4), Circle(1.5),
+                      grid_centers(4, 4, n, n))
+        c[f"perforate[3d,holes={side * side}]"] = lambda n=side: lambda: \
+            perforate(Box(4 * n + 4, 4 * n + 4, 2), Cylinder(1.5, 2),
+                      grid_centers(4, 4, n, n))
+        c[f"fill_centers[hex,holes~{count}]"] = lambda n=side: lambda: \
+            fill_centers(Circle(2.2 * n), 4, radius=1.5, margin=1)
+    for length in (10, 40, 160):
+        c[f"BoardSnapClip[length={length}]"] = lambda l=length: lambda: \
+            BoardSnapClip(length=l, snap_tolerance=0.1).make_negative()
+    for count in (4, 8, 16):
+        c[f"CommonJoinedPart[features={count * count}]"] = lambda n=count: \
+            lambda: PegBoard(count=n)
+    for size in (50, 100, 200):
+        c[f"SnapClipBoardStandoff[{size}x{size}]"] = lambda s=size: lambda: \
+            SnapClipBoardStandoff(inner_w=s, inner_l=s)
+        c[f"SnapClipBoardEnclosure[{size}x{size}]"] = lambda s=size: lambda: \
+            SnapClipBoardEnclosure(inner_w=s, inner_l=s)
+    def wrap_case(make):
+        """Wrap a made part's own shape 100 times"""
+        def setup():
+            part = make()
+            shape = Part(part.wrapped)
+            return lambda: [part.wrap(shape) for _ in range(100)]
+        return setup
+    for size in (50, 200):
+        c[f"wrap[SnapClipBoardStandoff,{size}x{size}]x100"] = wrap_case(
+            lambda s=size: SnapClipBoardStandoff(inner_w=s, inner_l=s))
+    for scale in (1, 2):
+        c[f"wrap[LCBoard,iFiDACMount,scale={scale}]x100"] = wrap_case(
+            lambda s=scale: ifidac_mount(s).children[1])
+    def connect_case():
+        """Connect a part to the top of another 100 times"""
+        part = SnapClipBoardStandoff()
+        base = Box(100, 100, 10)
+        return lambda: [connect_to(part, base, BOT, TOP) for _ in range(100)]
+    c["connect_to[SnapClipBoardStandoff]x100"] = connect_case
+    def connect_array_case(count, batched):
+        """Connect count screws laid out on a grid to the top of a plate"""
+        def setup():
+            side = math.isqrt(count)
+            screw = Cylinder(1.5, 10)
+            screws = [place(screw, Pos(x * 5, y * 5))
+                      for x in range(side) for y in range(side)]
+            plate = Box(5 * side, 5 * side, 3)
+            if batched:
+                return lambda: connect_all(screws, plate, BOT, TOP)
+            return lambda: [connect_to(s, plate, BOT, TOP) for s in screws]
+        return setup
+    for count in (100, 1024):
+        c[f"connect_to[screws={count}]"] = connect_array_case(count, False)
+        c[f"connect_all[screws={count}]"] = connect_array_case(count, True)
+    for height in (1, 2, 4, 8, 16, 42):
+        c[f"RackPanel[{height}U]"] = lambda h=height: lambda: \
+            RackPanel(heightU=h)
+    for scale in (1, 2):
+        c[f"iFiDACMount[scale={scale}]"] = lambda s=scale: lambda: \
+            ifidac_mount(s)
+
+    def nest_case(count):
+        """Nest count rectangular and L-shaped boards on 600x400 sheets"""
+        def setup():
+            boards = []
+            for i in range(count):
+                w, h = 30 + (i * 37) % 170, 30 + (i * 53) % 120
+                if i % 3:
+                    board = Rectangle(w, h)
+                else:
+                    board = Polygon((0, 0), (w, 0), (w, h / 3), (w / 3, h / 3),
+                                    (w / 3, h), (0, h))
+                board.label = f"board{i}"
+                boards.append(board)
+            return lambda: nest_boards(boards, 600, 400)
+        return setup
+    for count in (10, 60):
+        c[f"nest_boards[boards={count}]"] = nest_case(count)
+
+    def rebuild_case(scale):
+        """Resize the bottom board of a labeled iFiDACMount and rebuild,
+        checking that every remade board keeps its label"""
+        def setup():
+            builder, boards = ifidac_builder(scale)
+            builder.label_objects(boards, boards)
+            widths = [6.5 * IN * scale, 7 * IN * scale]
+            depth = 4 * IN * scale + 1 / 8 * IN
+
+            def run():
+                widths.reverse()
+                builder.update_board(boards["bottom"],
+                                     sk=Rectangle(widths[0], depth))
+                assembly = builder.make_assembly()
+                labels = [c.label for c in assembly.children]
+                if not set(boards) <= set(labels):
+                    raise RuntimeError(f"Labels lost by rebuild: {labels}")
+            return run
+        return setup
+    for scale in (1, 2):
+        c[f"LCBuilder.rebuild[iFiDACMount,scale={scale}]"] = \
+            rebuild_case(scale)
+
+    def downstream_case(scale, unified):
+        """Section and drill every board of a multi-joint assembly, made
+        with or without unifying join results"""
+        def setup():
+            set_unify(unified)
+            boards = [b for b in ifidac_mount(scale).children
+                      if isinstance(b, LCBoard)]
+            set_unify(False)
+            counts = [topology_counts(b) for b in boards]
+            drill = Cylinder(2, 100)
+
+            def run():
+                for board in boards:
+                    section_board(board)
+                    cut_all(board, [place(drill, board.location)])
+            run.metrics = {"faces": sum(c[0] for c in counts),
+                           "edges": sum(c[1] for c in counts)}
+            return run
+        return setup
+    for scale in (1, 2):
+        for unified in (False, True):
+            c[f"downstream[iFiDACMount,scale={scale},unify={unified}]"] = \
+                downstream_case(scale, unified)
+
+    def enclosure(): return SnapClipBoardEnclosure()
+    def base(): return SnapClipBoardEnclosure().children[0]
+    def cut(): return section_board(ifidac_mount().children[1])
+    c["export[stl]"] = export_case(
+        lambda obj, fn: save_stl(obj, f"{fn}.stl"), base)
+    c["export[step]"] = export_case(
+        lambda obj, fn: exporters3d.export_step(obj, f"{fn}.step"), enclosure)
+    c["export[svg]"] = export_case(
+        lambda obj, fn: save_svg(obj, f"{fn}.svg"), cut)
+    c["export[dxf]"] = export_case(
+        lambda obj, fn: save_dxf(obj, f"{fn}.dxf"), cut)
+
+    def rack_of_panels(fn, ext, fast):
+        """Every 1U to 8U rack and modular panel, written as ext"""
+        for h in range(1, 9):
+            for cls in (RackPanel, ModularPanel):
+                out = f"{fn}_{cls.__name__}{h}.{ext}"
+                profile = flat_profile(cls, heightU=h) if fast else None
+                if profile is not None:
+                    profile.write(out)
+                elif ext == "svg":
+                    save_svg(cls(heightU=h), out)
+                else:
+                    save_dxf(cls(heightU=h), out)
+    for ext in ("svg", "dxf"):
+        for fast in (False, True):
+            c[f"panels[{ext},fast_path={fast}]"] = export_case(
+                lambda _, fn, e=ext, f=fast: rack_of_panels(fn, e, f),
+                lambda: None)
+    for jobs in (1, 4):
+        c[f"export[assembled_projected_svg,jobs={jobs}]"] = export_case(
+            lambda obj, fn, j=jobs: export_assembled_projected_svg(
+                obj, fn, jobs=j), lambda: ifidac_mount(2))
+        for ext in ("svg", "dxf"):
+            c[f"export[assembled_projected_{ext},combined,jobs={jobs}]"] = \
+                export_case(lambda obj, fn, j=jobs, e=ext:
+                            export_assembled_projected_svg(
+                                obj, fn, jobs=j, combined=f"{fn}.{e}"),
+                            lambda: ifidac_mount(2))
+    c["export[assembled_projected_svg,combined,dedupe]"] = export_case(
+        lambda obj, fn: export_assembled_projected_svg(
+            obj, fn, combined=f"{fn}.svg", spacing=0, dedupe_tolerance=0.01),
+        lambda: ifidac_mount(2))
+    c["export[assembled_projected_svg,combined,order]"] = export_case(
+        lambda obj, fn: export_assembled_projected_svg(
+            obj, fn, combined=f"{fn}.svg", order=True),
+        lambda: ifidac_mount(2))
+    return c
+
+
+def _rss():
+    """Current resident set size in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return _max_rss()
+
+
+def _max_rss():
+    """Peak resident set size in bytes, since the last _reset_peak_rss"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in KiB on Linux, in bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak resident set size to the current one, where the
+    kernel supports it"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _measure(setup, repeat):
+    # Builds must not be answered from the geometry cache
+    bd_cache.set_geometry_cache(None)
+    func = setup()
+    # Only count memory used by the measured runs, not by setup. Where
+    # the peak can not be reset, count growth beyond the setup peak
+    start_rss = _rss() if _reset_peak_rss() else _max_rss()
+    best = None
+    for _ in range(repeat):
+        # Every run should make shared sub-parts again
+        clear_shared_instances()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    result = {"time": best, "peak_memory": max(_max_rss() - start_rss, 0)}
+    # Extra metrics of the case, e.g. topology counts
+    result.update(getattr(func, "metrics", {}))
+    return result
+
+
+def _measure_safe(setup, repeat):
+    try:
+        return _measure(setup, repeat)
+    except Exception as e:
+        return {"error": repr(e)}
+
+
+def _measure_child(conn, setup, repeat):
+    conn.send(_measure_safe(setup, repeat))
+
+
+def measure(setup, repeat):
+    """Time setup() best of repeat runs, in a forked process so that peak
+    memory is measured per case. Returns {"error": ...} if the case
+    raises or its process dies"""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return _measure_safe(setup, repeat)
+    ctx = multiprocessing.get_context("fork")
+    recv, send = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_measure_child, args=(send, setup, repeat))
+    proc.start()
+    # Only the child holds the sending end, so recv ends if it dies
+    send.close()
+    try:
+        result = recv.recv()
+    except EOFError:
+        result = None
+    proc.join()
+    if result is None:
+        result = {"error": f"process exited with code {proc.exitcode}"}
+    return result
+
+
+def compare(name, result, base, tolerance):
+    """Returns descriptions of regressions of result against base"""
+    regressions = []
+    for key, min_diff in (("time", MIN_TIME_DIFF),
+                          ("peak_memory", MIN_MEMORY_DIFF)):
+        if key not in base or key not in result:
+            continue
+        if result[key] > base[key] * (1 + tolerance) and \
+                result[key] - base[key] > min_diff:
+            regressions.append(f"{name}: {key} {result[key]:.4g} > "
+                               f"baseline {base[key]:.4g}")
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-k", "--filter", default="",
+                        help="Only run cases whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Runs per case, the best time is reported")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE,
+                        help="Baseline JSON file to compare against")
+    parser.add_argument("-s", "--save", default=False, action="store_true",
+                        help="Save results as the baseline instead of comparing")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.25,
+                        help="Allowed relative increase over the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = {}
+    regressions = []
+    print(f"{'case':<50} {'time (s)':>10} {'peak (MiB)':>11} {'baseline (s)':>13}")
+    for name, setup in cases().items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(setup, args.repeat)
+        if "error" in result:
+            regressions.append(f"{name}: failed with {result['error']}")
+            print(f"{name:<50} failed: {result['error']}")
+            continue
+        base = baseline.get(name, {})
+        base_time = f"{base['time']:.4f}" if "time" in base else "-"
+        extra = "".join(f" {k}={v}" for k, v in result.items()
+                        if k not in ("time", "peak_memory"))
+        print(f"{name:<50} {result['time']:>10.4f} "
+              f"{result['peak_memory'] / 1024 / 1024:>11.1f} {base_time:>13}"
+              f"{extra}")
+        regressions += compare(name, result, base, args.tolerance)
+
+    if args.save:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+        else:
+            saved = {}
+        saved.update((k, v) for k, v in results.items() if "error" not in v)
+        with open(args.baseline, "w") as f:
+            json.dump(saved, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print("\nREGRESSIONS:\n" + "\n".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
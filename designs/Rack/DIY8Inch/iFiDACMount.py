@@ -63,15 +63,12 @@ side_left = builder.add_board(side_sk.mirror(Plane.XZ),
                               joint_config=4)
 
 
-side_right_new, panel_new = side_right.join_inplace(panel, 2)
-side_left_new, panel_new = side_left.join_inplace(panel_new, 2)
-builder.replace_part(side_right, side_right_new)
-builder.replace_part(side_left, side_left_new)
-builder.replace_part(panel, panel_new)
+builder.join_inplace(side_right, panel, 2)
+builder.join_inplace(side_left, panel, 2)
 
-panel_reinforcement = panel.unjoined_board_synced.moved(
-    Pos(Y=-panel.thickness))
-builder.add_part(panel_reinforcement)
+panel_reinforcement = builder.add_part(
+    lambda panel: panel.unjoined_board_synced.moved(Pos(Y=-panel.thickness)),
+    depends_on=[panel])
 
 objs = ("panel_reinforcement", "panel", "bottom",
         "back", "side_left", "side_right")
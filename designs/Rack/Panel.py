@@ -1,6 +1,8 @@
 import cad_common
 from build123d import *
 from bd_common import *
+from bd_pattern import grid_centers, perforate
+from bd_flat import FlatProfile, RoundedRect, Stadium, flat_profile
 
 from typing import Union, Literal, List, Tuple
 import copy
@@ -21,6 +23,8 @@ class RackPanel(CommonSketch):
     holeW: float = 3.5
     filletR: float = 2
 
+    cacheable = True
+
     @property
     def width(self):
         return self.widthIn*IN
@@ -29,15 +33,24 @@ class RackPanel(CommonSketch):
     def height(self):
         return self.heightU*self.uHeightIn*IN
 
+    def slot_centers(self):
+        slots1U = grid_centers((self.widthIn - self.railWidthIn) * IN,
+            2 * self.holeYDistIn * IN, 2, 2)
+        units = grid_centers(0, self.uHeightIn*IN, 1, self.heightU)
+        return (units[:, None] + slots1U[None]).reshape(-1, 2)
+
     def make(self):
         main = Rectangle(self.width, self.height - 2*self.heightTolerance)
         main = fillet(main.vertices(), self.filletR)
         slot = SlotCenterPoint((0, 0), (self.holeW/2, 0), self.holeD)
-        slots1U = Sketch() + [loc *slot for loc in GridLocations((self.widthIn - self.railWidthIn) * IN, 
-            2 * self.holeYDistIn * IN, 2, 2)]
-        slots = [loc * slots1U for loc in GridLocations(0, self.uHeightIn*IN, 1, self.heightU)]
-        main = main - slots
-        return main
+        return perforate(main, slot, self.slot_centers())
+
+    def make_profile(self):
+        outline = RoundedRect(self.width,
+            self.height - 2*self.heightTolerance, self.filletR)
+        return FlatProfile(outline, [
+            Stadium(self.holeD/2, float(x), float(y), self.holeW/2)
+            for x, y in self.slot_centers()])
 
 @dataclass(kw_only=True)
 class ModularPanel(CommonSketch):
@@ -50,6 +63,8 @@ class ModularPanel(CommonSketch):
     frameHeight: float = 9
     filletR: float = 2
 
+    cacheable = True
+
     @property
     def netHeight():
         return self.heightU*self.uHeightIn*IN - 2 * self.frameHeight
@@ -62,19 +77,29 @@ class ModularPanel(CommonSketch):
     def height(self):
         return self.heightU*self.uHeightIn*IN
     
+    def hole_centers(self):
+        return grid_centers(self.uWidth, self.height - self.frameHeight,
+            self.widthU, 2)
+
     def make(self):
         main = Rectangle(self.width, self.height - 2*self.heightTolerance)
         main = fillet(main.vertices(), self.filletR)
-        main -= [loc * Circle(self.holeD/2) for loc in
-            GridLocations(self.uWidth, self.height - self.frameHeight,
-                self.widthU, 2)]
-        return main
+        return perforate(main, Circle(self.holeD/2), self.hole_centers())
+
+    def make_profile(self):
+        outline = RoundedRect(self.width,
+            self.height - 2*self.heightTolerance, self.filletR)
+        return FlatProfile(outline, [Stadium(self.holeD/2, float(x), float(y))
+            for x, y in self.hole_centers()])
 
 if __name__ == "__main__":
     from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
     parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
-    parser.add_argument("--output", default="output/Panel.svg", help="Output file path")
-    subs = parser.add_subparsers(dest="panel_type", help="Type of panel")
+    parser.add_argument("--output", default="output/Panel.svg", help="Output file path, .svg or .dxf")
+    parser.add_argument("--no_fast_path", default=False, action="store_true",
+        help="Always build the sketch instead of writing its profile directly")
+    subs = parser.add_subparsers(dest="panel_type", help="Type of panel",
+        required=True)
     parser_rack = subs.add_parser("rack", help="Rack mount panel")
     for f in fields(RackPanel):
         parser_rack.add_argument(f"--{f.name}", default=f.default, type=f.type, help=f"Value for {f.name}")
@@ -82,13 +107,15 @@ if __name__ == "__main__":
     for f in fields(ModularPanel):
         parser_mod.add_argument(f"--{f.name}", default=f.default, type=f.type, help=f"Value for {f.name}")
     args = parser.parse_args()
-    if args.panel_type == "rack":
-        part_args = dict((f.name, getattr(args, f.name)) for f in fields(RackPanel))
-        panel = RackPanel(**part_args)
-    elif args.panel_type == "modular":
-        part_args = dict((f.name, getattr(args, f.name)) for f in fields(ModularPanel))
-        panel = ModularPanel(**part_args)
-    exporter = ExportSVG(unit=Unit.MM, line_weight=0.5)
-    exporter.add_layer("Layer 1", line_color=(0, 0, 0))
-    exporter.add_shape(panel, layer="Layer 1")
-    exporter.write(args.output)
+    panel_class = {"rack": RackPanel, "modular": ModularPanel}[args.panel_type]
+    part_args = dict((f.name, getattr(args, f.name)) for f in fields(panel_class))
+    profile = None if args.no_fast_path else flat_profile(panel_class, **part_args)
+    if profile is not None:
+        profile.write(args.output)
+    elif args.output.lower().endswith(".dxf"):
+        save_dxf(panel_class(**part_args), args.output)
+    else:
+        exporter = ExportSVG(unit=Unit.MM, line_weight=0.5)
+        exporter.add_layer("Layer 1", line_color=(0, 0, 0))
+        exporter.add_shape(panel_class(**part_args), layer="Layer 1")
+        exporter.write(args.output)
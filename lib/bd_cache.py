@@ -0,0 +1,378 @@
+"""Persistent content-addressed geometry cache for CommonPart and
+CommonSketch builds.
+
+The cache is opt-in: it is only used after set_geometry_cache() is called
+or the BD_GEOMETRY_CACHE environment variable points to a directory, and
+only for classes that set `cacheable = True`.
+Each build is keyed on the class, its dataclass field values, the
+process-wide settings it reads (see register_setting) and the library
+source version, and stored as a BREP file. Entries are evicted in
+LRU order (by file mtime) once the cache grows beyond its size cap.
+
+Environment variables:
+    BD_GEOMETRY_CACHE: cache directory, enables the cache
+    BD_GEOMETRY_CACHE_SIZE: size cap in MiB, defaults to 512
+    BD_GEOMETRY_CACHE_REFRESH: if set, ignore stored entries and rebuild
+    BD_GEOMETRY_CACHE_STATS: if set, print hit/miss counters on exit"""
+import os, sys
+import io
+import atexit
+import hashlib
+import inspect
+import json
+import warnings
+from enum import Enum
+from dataclasses import fields
+from typing import Any, Callable, Dict, Optional
+import build123d
+import bd_trace
+from build123d import Color, Compound, Part, Sketch, Vector, Location
+from OCP.BRep import BRep_Builder
+from OCP.BRepTools import BRepTools
+from OCP.TopAbs import TopAbs_COMPOUND
+from OCP.TopoDS import TopoDS_Shape, TopoDS_Compound, TopoDS_Iterator
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+
+class _Unkeyable(Exception):
+    pass
+
+
+def _key_value(v):
+    """Stable textual representation of a field value for cache keys.
+    Raises _Unkeyable for values that can not be represented, e.g. shapes"""
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return repr(v)
+    if isinstance(v, Enum):
+        return f"{type(v).__qualname__}.{v.name}"
+    if isinstance(v, (tuple, list)):
+        return "(" + ",".join(_key_value(i) for i in v) + ")"
+    if isinstance(v, dict):
+        return "{" + ",".join(f"{_key_value(k)}:{_key_value(v[k])}"
+                              for k in sorted(v, key=repr)) + "}"
+    if isinstance(v, (Vector, Location)):
+        return repr(v.to_tuple())
+    raise _Unkeyable
+
+
+def _hash_file(h, fn):
+    with open(fn, "rb") as f:
+        h.update(f.read())
+
+
+_library_digest = None
+
+
+def library_digest():
+    """Digest of the library sources (every .py file under lib/) and the
+    build123d version"""
+    global _library_digest
+    if _library_digest is None:
+        h = hashlib.sha256(build123d.__version__.encode())
+        lib_dir = os.path.dirname(os.path.abspath(__file__))
+        for root, dirs, files in os.walk(lib_dir):
+            dirs.sort()
+            for fn in sorted(files):
+                if fn.endswith(".py"):
+                    _hash_file(h, os.path.join(root, fn))
+        _library_digest = h.hexdigest()
+    return _library_digest
+
+
+_class_digests = {}
+
+
+def _class_digest(cls):
+    """Digest of the library plus the source files defining cls and its
+    bases, which covers classes defined outside lib/, e.g. in designs/"""
+    if cls not in _class_digests:
+        h = hashlib.sha256(library_digest().encode())
+        for c in cls.__mro__:
+            try:
+                fn = inspect.getsourcefile(c)
+            except (TypeError, OSError):
+                continue
+            if fn and os.path.exists(fn):
+                _hash_file(h, fn)
+        _class_digests[cls] = h.hexdigest()
+    return _class_digests[cls]
+
+
+def clear_source_digests():
+    """Forget computed source digests, e.g. after reloading modules"""
+    global _library_digest
+    _library_digest = None
+    _class_digests.clear()
+
+
+def brep_size(shape) -> int:
+    """Size of the BREP serialization of shape, as an estimate of the
+    memory it uses"""
+    stream = io.BytesIO()
+    BRepTools.Write_s(shape.wrapped, stream)
+    return len(stream.getvalue())
+
+
+def as_compound(wrapped):
+    """wrapped, or a compound of it if it is not one already, as
+    BasePartObject wraps the shapes it is made of"""
+    if wrapped.ShapeType() == TopAbs_COMPOUND:
+        return wrapped
+    builder = BRep_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+    builder.Add(compound, wrapped)
+    return compound
+
+
+def wrap_dim(wrapped, dim):
+    """Part, Sketch or Compound of wrapped, by the dimension of the shape
+    it comes from. Parts and Sketches get a compound of wrapped like
+    those made by BasePartObject, so that they can be added to each other"""
+    if dim == 3:
+        return Part(as_compound(wrapped))
+    elif dim == 2:
+        return Sketch(as_compound(wrapped))
+    return Compound(wrapped)
+
+
+def _write_brep(shapes: list, fn: str):
+    builder = BRep_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+    for s in shapes:
+        builder.Add(compound, s.wrapped)
+    BRepTools.Write_s(compound, fn)
+
+
+def _read_brep(fn: str) -> list:
+    compound = TopoDS_Shape()
+    BRepTools.Read_s(compound, fn, BRep_Builder())
+    shapes = []
+    it = TopoDS_Iterator(compound)
+    while it.More():
+        shapes.append(it.Value())
+        it.Next()
+    return shapes
+
+
+def _write_meta(shapes: list, fn: str):
+    meta = [{"dim": s._dim, "label": s.label,
+             "color": s.color.to_tuple() if s.color else None}
+            for s in shapes]
+    with open(fn, "w") as f:
+        json.dump(meta, f)
+
+
+def _read_meta(fn: str) -> list:
+    with open(fn) as f:
+        return json.load(f)
+
+
+def _rewrap(wrapped, meta: dict):
+    """Shape like the one stored, as a build would have made it"""
+    shape = wrap_dim(wrapped, meta["dim"])
+    shape.label = meta["label"]
+    if meta["color"] is not None:
+        shape.color = Color(*meta["color"])
+    return shape
+
+
+# Process-wide settings builds may read, name -> getter
+_settings: Dict[str, Callable[[], Any]] = {}
+
+
+def register_setting(name: str, getter: Callable[[], Any]):
+    """Key cached builds and shared instances on a process-wide setting
+    that make() may read, e.g. layer_height, so that changing it does not
+    return geometry made with the previous value"""
+    _settings[name] = getter
+
+
+def settings() -> Dict[str, Any]:
+    """Current values of the registered settings"""
+    return {name: getter() for name, getter in _settings.items()}
+
+
+def params_key(params: dict) -> Optional[str]:
+    """Stable textual key of parameter values, or None if any of them can
+    not be keyed"""
+    try:
+        return ";".join(f"{k}={_key_value(params[k])}" for k in sorted(params))
+    except _Unkeyable:
+        return None
+
+
+class GeometryCache(object):
+    """On-disk BREP cache, see module documentation.
+    Args:
+        path: directory holding cache entries
+        max_size: size cap in bytes, least recently used entries are
+            evicted when exceeded
+        refresh: ignore stored entries, forcing every build to run and
+            overwrite its entry"""
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE,
+                 refresh: bool = False):
+        self.path = path
+        self.max_size = max_size
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+
+    def key_for(self, obj) -> Optional[str]:
+        """Returns the cache key of a part object, or None if any of its
+        field values or globals can not be keyed. Globals are those of
+        obj.cache_globals(), or all registered settings"""
+        params = dict((f.name, getattr(obj, f.name)) for f in fields(obj)
+                      if f.name not in obj.cached_attrs)
+        params["__globals__"] = getattr(obj, "cache_globals", settings)()
+        params = params_key(params)
+        if params is None:
+            return None
+        cls = obj.__class__
+        h = hashlib.sha256(f"{cls.__module__}.{cls.__qualname__}".encode())
+        h.update(_class_digest(cls).encode())
+        h.update(params.encode())
+        return h.hexdigest()
+
+    def _entry_path(self, key: str):
+        return os.path.join(self.path, f"{key}.brep")
+
+    def _meta_path(self, brep_path: str):
+        return brep_path[:-len(".brep")] + ".json"
+
+    def _remove(self, brep_path: str):
+        os.remove(brep_path)
+        if os.path.exists(self._meta_path(brep_path)):
+            os.remove(self._meta_path(brep_path))
+
+    def load(self, obj, key: str) -> bool:
+        """Set cached shape attributes of obj from the entry for key,
+        returns whether the entry was found"""
+        fn = self._entry_path(key)
+        shapes = meta = None
+        if not self.refresh and os.path.exists(fn):
+            try:
+                shapes = _read_brep(fn)
+                meta = _read_meta(self._meta_path(fn))
+            except Exception:
+                shapes = None
+        n = len(obj.cached_attrs)
+        if not shapes or len(shapes) != n or len(meta) != n:
+            self.misses += 1
+            return False
+        for name, s, m in zip(obj.cached_attrs, shapes, meta):
+            setattr(obj, name, _rewrap(s, m))
+        os.utime(fn)
+        self.hits += 1
+        return True
+
+    def store(self, obj, key: str):
+        """Store cached shape attributes of obj under key"""
+        shapes = [getattr(obj, name, None) for name in obj.cached_attrs]
+        if any(s is None for s in shapes):
+            return
+        fn = self._entry_path(key)
+        tmp_fn = f"{fn}.{os.getpid()}.tmp"
+        # The BREP file marks the entry, so its metadata goes first
+        _write_meta(shapes, tmp_fn)
+        os.replace(tmp_fn, self._meta_path(fn))
+        _write_brep(shapes, tmp_fn)
+        os.replace(tmp_fn, fn)
+        self.evict()
+
+    def _entries(self):
+        return [e for e in os.scandir(self.path) if e.name.endswith(".brep")]
+
+    def evict(self):
+        """Evict least recently used entries until under the size cap"""
+        entries = sorted((e.stat().st_mtime, e.stat().st_size, e.path)
+                         for e in self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, obj=None):
+        """Remove the entry of a part object, or all entries if obj is None"""
+        if obj is None:
+            for e in self._entries():
+                self._remove(e.path)
+            return
+        key = self.key_for(obj)
+        if key and os.path.exists(self._entry_path(key)):
+            self._remove(self._entry_path(key))
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size": sum(e.stat().st_size for e in entries),
+        }
+
+
+_cache = None
+
+
+def set_geometry_cache(path: Optional[str], **kwargs) -> Optional[GeometryCache]:
+    """Enable the geometry cache at path, or disable it if path is None.
+    Extra arguments are passed to GeometryCache"""
+    global _cache
+    _cache = GeometryCache(path, **kwargs) if path else None
+    return _cache
+
+
+def geometry_cache() -> Optional[GeometryCache]:
+    return _cache
+
+
+def cached_make(obj):
+    """Build a CommonPart/CommonSketch object by its _make method, going
+    through the geometry cache if it is enabled and applicable.
+    Cache hits only restore obj.cached_attrs, builds that set other
+    attributes are not stored, with a warning"""
+    key = None
+    if _cache is not None and obj.cacheable and \
+            getattr(obj, obj.cached_attrs[0]) is None:
+        key = _cache.key_for(obj)
+    if key is not None:
+        with bd_trace.span("GeometryCache.load"):
+            if _cache.load(obj, key):
+                return
+    before = set(vars(obj))
+    obj._make()
+    if key is None:
+        return
+    uncached = sorted(set(vars(obj)) - before - set(obj.cached_attrs))
+    if uncached:
+        warnings.warn(f"{type(obj).__name__}.make() sets {uncached}, which "
+                      "cache hits would not restore, add them to "
+                      "cached_attrs. Not caching it")
+        return
+    with bd_trace.span("GeometryCache.store"):
+        _cache.store(obj, key)
+
+
+def _print_stats():
+    if _cache is not None:
+        print(f"Geometry cache: {_cache.stats()}", file=sys.stderr)
+
+
+if os.environ.get("BD_GEOMETRY_CACHE"):
+    set_geometry_cache(
+        os.environ["BD_GEOMETRY_CACHE"],
+        max_size=int(float(os.environ.get("BD_GEOMETRY_CACHE_SIZE", 512))
+                     * 1024 * 1024),
+        refresh=bool(os.environ.get("BD_GEOMETRY_CACHE_REFRESH")))
+if os.environ.get("BD_GEOMETRY_CACHE_STATS"):
+    atexit.register(_print_stats)
@@ -1,16 +1,38 @@
 import cad_common
+import bd_cache
+from bd_cache import as_compound, wrap_dim
+import bd_trace
+import bd_cutpath
 from build123d import *
-from build123d import Shape
-from build123d import exporters3d
+from build123d import Shape, SkipClean
 from dataclasses import dataclass, fields, _MISSING_TYPE, field
-from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 from typing import (
-    Union, List, Optional, Type, Callable, Tuple, Dict, Any)
+    Union, List, Optional, Type, Callable, Tuple, Dict, Any, Iterable)
+from OCP.BRep import BRep_Builder
+from OCP.BRepTools import BRepTools
+from OCP.TopoDS import TopoDS_Compound, TopoDS_Iterator, TopoDS_Shape
+from OCP.TopTools import TopTools_IndexedMapOfShape, TopTools_ListOfShape
+from OCP.TopAbs import TopAbs_EDGE, TopAbs_FACE
+from OCP.TopExp import TopExp
+from OCP.ShapeUpgrade import ShapeUpgrade_UnifySameDomain
+from OCP.BRepAlgoAPI import (
+    BRepAlgoAPI_BooleanOperation, BRepAlgoAPI_Fuse, BRepAlgoAPI_Cut)
 from enum import Enum
 from copy import copy
-import os, sys
+import functools
+import io
+import weakref
+import os
 import math
 import colorsys
+import numpy as np
+# Face and bounding box lookups, re-exported for design files
+from bd_index import shape_bbox, shape_bounds
+# CLI layer, re-exported for design files
+from cad_cli import (
+    init_dataclass_from, BuildMemo, CommonCLI, CommonPartCLI,
+    CommonAssemblyCLI, SaveError, map_forked, note_native_threads,
+    run_save_tasks)
 
 _layer_height = 0.2
 
@@ -36,6 +58,11 @@ def set_line_width(w):
     _line_width = w
 
 
+# Read by FloatingHoleBridgeMask, and so by NutTrap
+bd_cache.register_setting("layer_height", layer_height)
+bd_cache.register_setting("line_width", line_width)
+
+
 # Origin
 O = Vector(0, 0, 0)
 CENTER = O
@@ -51,10 +78,24 @@ RIGHT = Vector(1, 0, 0)
 
 
 def anchor(shape, anchor_vector: Vector, keep_lcs: bool = True):
-    result = shape.moved(anchor_loc(shape, anchor_vector))
+    loc = anchor_loc(shape, anchor_vector)
     if not keep_lcs:
+        result = shape.moved(loc)
         result.relocate(shape.location)
-    return result
+        return result
+    return _moved(shape, loc)
+
+
+def _moved(shape, loc: Location):
+    """shape.moved(loc), keeping plain Parts, Sketches and Compounds as
+    location-only copies like place(), e.g. shared instances. Objects of
+    other classes, e.g. CommonPart objects, carry state of their own and
+    are copied by moved(), as are shapes with children or joints, which
+    place() does not keep"""
+    if (type(shape) in (Part, Sketch, Compound) and not shape.children
+            and not getattr(shape, "joints", None)):
+        return place(shape, loc)
+    return shape.moved(loc)
 
 
 def anchor_loc(shape, anchor_vector: Vector):
@@ -67,13 +108,18 @@ def min_max_to_bounds(min_vec, max_vec):
             (min_vec.Z, max_vec.Z))
 
 
-def bound_loc(bb, bound_vector: Vector):
+def _to_bounds(bb):
     if isinstance(bb, Shape):
-        bb = bb.bounding_box()
+        bb = shape_bbox(bb)
     if isinstance(bb, BoundBox):
         bb = (bb.min, bb.max)
     if isinstance(bb, tuple) and isinstance(bb[0], Vector):
         bb = min_max_to_bounds(*bb)
+    return bb
+
+
+def bound_loc(bb, bound_vector: Vector):
+    bb = _to_bounds(bb)
 
     def _calc_coord(direction, bounds):
         if direction > 0:
@@ -88,6 +134,320 @@ def bound_loc(bb, bound_vector: Vector):
     return Pos(*bound_vec)
 
 
+def bounds_array(bbs) -> np.ndarray:
+    """(N, 3, 2) min and max X, Y and Z of shapes, bounding boxes or
+    anything else bound_loc takes, shapes are measured at once by
+    shape_bounds"""
+    bbs = list(bbs)
+    bounds = np.empty((len(bbs), 3, 2))
+    shapes = [i for i, bb in enumerate(bbs) if isinstance(bb, Shape)]
+    if shapes:
+        bounds[shapes] = shape_bounds([bbs[i] for i in shapes])
+    for i, bb in enumerate(bbs):
+        if not isinstance(bb, Shape):
+            bounds[i] = _to_bounds(bb)
+    return bounds
+
+
+def _vector_array(vectors, n: int) -> np.ndarray:
+    """(n, 3) array of a single Vector or of a sequence of n vectors"""
+    if isinstance(vectors, Vector):
+        vectors = [vectors]
+    return np.broadcast_to(
+        np.array([tuple(v) for v in vectors], dtype=float), (n, 3))
+
+
+def bound_points(bounds: np.ndarray, bound_vectors) -> np.ndarray:
+    """(N, 3) points of bound_loc for (N, 3, 2) bounds, e.g. from
+    bounds_array, and a single vector or one per bounds"""
+    signs = np.sign(_vector_array(bound_vectors, len(bounds)))
+    if np.isnan(signs).any():
+        raise ValueError
+    return np.where(signs > 0, bounds[..., 1],
+                    np.where(signs < 0, bounds[..., 0], bounds.mean(axis=-1)))
+
+
+def bound_locs(bbs, bound_vectors) -> List[Location]:
+    """bound_loc of many shapes or bounding boxes, for a single vector or
+    one per shape"""
+    return [Pos(*p) for p in
+            bound_points(bounds_array(bbs), bound_vectors).tolist()]
+
+
+def anchor_locs(shapes, anchor_vectors) -> List[Location]:
+    """anchor_loc of many shapes, for a single vector or one per shape"""
+    return [Pos(*p) for p in
+            (-bound_points(bounds_array(shapes), anchor_vectors)).tolist()]
+
+
+def _offset_all(shapes: List[Shape], anchors: np.ndarray,
+                targets: np.ndarray, keep_lcs: bool) -> list:
+    """Location-only copies of shapes moved from anchors to targets"""
+    if keep_lcs:
+        return [place(shape, Pos(*offset)) for shape, offset
+                in zip(shapes, (targets - anchors).tolist())]
+    results = []
+    for shape, a, t in zip(shapes, (-anchors).tolist(), targets.tolist()):
+        result = place(shape, Pos(*a))
+        result.relocate(shape.location)
+        result.move(Pos(*t))
+        results.append(result)
+    return results
+
+
+@bd_trace.traced()
+def anchor_all(shapes, anchor_vectors, keep_lcs: bool = True) -> list:
+    """anchor of many shapes, for a single Vector or a sequence of one per
+    shape, with all offsets computed at once. Returns location-only copies
+    as made by place(), e.g. for print plates or fastener arrays"""
+    shapes = list(shapes)
+    anchors = bound_points(bounds_array(shapes), anchor_vectors)
+    return _offset_all(shapes, anchors, np.zeros_like(anchors), keep_lcs)
+
+
+@bd_trace.traced()
+def connect_all(shapes, targets, from_vecs, to_vecs,
+                keep_lcs: bool = True) -> list:
+    """connect_to of many shapes, to a single target or a sequence of one
+    per shape, shapes or bounding boxes, for single Vectors or sequences
+    of one per shape, with all offsets computed at once. Returns
+    location-only copies as made by place()"""
+    shapes = list(shapes)
+    # A (min, max) pair of Vectors is a single bounding box
+    if isinstance(targets, (Shape, BoundBox)) or (
+            isinstance(targets, tuple) and len(targets) == 2 and
+            all(isinstance(v, Vector) for v in targets)):
+        targets = [targets]
+    target_bounds = np.broadcast_to(bounds_array(targets),
+                                    (len(shapes), 3, 2))
+    anchors = bound_points(bounds_array(shapes), from_vecs)
+    return _offset_all(shapes, anchors, bound_points(target_bounds, to_vecs),
+                       keep_lcs)
+
+
+def instance_compound(shape, locations: Iterable[Location]):
+    """Compound of location-only instances of shape, sharing its
+    underlying geometry, at each of the given locations.
+    Use it to place many copies of a tool as a single boolean operand"""
+    builder = BRep_Builder()
+    comp = TopoDS_Compound()
+    builder.MakeCompound(comp)
+    for loc in locations:
+        builder.Add(comp, shape.wrapped.Moved(loc.wrapped))
+    return wrap_dim(comp, shape._dim)
+
+
+def place(shape, loc: Union[Location, Plane, None] = None):
+    """Location-only copy of shape moved by loc, sharing its underlying
+    geometry. `loc * shape` copies the geometry instead, use this to
+    place shared instances, see shared_instance"""
+    if isinstance(loc, Plane):
+        loc = loc.location
+    wrapped = shape.wrapped if loc is None else shape.wrapped.Moved(loc.wrapped)
+    placed = wrap_dim(wrapped, shape._dim)
+    placed.color = shape.color
+    placed.label = shape.label
+    return placed
+
+
+# Flyweight registry of shared_instance and shared_method,
+# class -> {key: object or shape}. Entries go away with their class, e.g.
+# when it is redefined in watch mode
+_shared = weakref.WeakKeyDictionary()
+
+
+def shared_instance(cls, **params):
+    """Process-wide flyweight of cls(**params), objects of the same class
+    and parameter values are only made once. Place the returned object
+    with place() and do not modify it in place. Objects are also keyed on
+    the settings of bd_cache.register_setting, e.g. layer_height.
+    Parameters that can not be keyed, e.g. shapes, make a new object every
+    time"""
+    key = bd_cache.params_key(dict(params, __globals__=bd_cache.settings()))
+    if key is None:
+        return cls(**params)
+    entries = _shared.setdefault(cls, {})
+    if key not in entries:
+        entries[key] = cls(**params)
+    return entries[key]
+
+
+def clear_shared_instances():
+    """Forget all objects and shapes of shared_instance and shared_method"""
+    _shared.clear()
+
+
+def shared_method(func):
+    """Decorator memoizing shapes returned by a CommonPart or CommonSketch
+    method process-wide, by class, field values, arguments and
+    cache_globals(), e.g. for negatives of repeated features. Callers get
+    location-only copies of the memoized shape"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        params = dict((f.name, getattr(self, f.name)) for f in fields(self)
+                      if f.name not in self.cached_attrs)
+        params.update(__method__=func.__name__, __args__=args,
+                      __kwargs__=kwargs, __globals__=self.cache_globals())
+        key = bd_cache.params_key(params)
+        if key is None:
+            return func(self, *args, **kwargs)
+        entries = _shared.setdefault(type(self), {})
+        if key not in entries:
+            entries[key] = func(self, *args, **kwargs)
+        return place(entries[key])
+    return wrapper
+
+
+def _checked_bool_op(operation: BRepAlgoAPI_BooleanOperation,
+                     args: Iterable[Shape], tools: Iterable[Shape]):
+    """Run a boolean operation of args with tools, returns None if the
+    kernel reports failure instead of a possibly broken result"""
+    arg_list = TopTools_ListOfShape()
+    for s in args:
+        arg_list.Append(s.wrapped)
+    tool_list = TopTools_ListOfShape()
+    for s in tools:
+        tool_list.Append(s.wrapped)
+    operation.SetArguments(arg_list)
+    operation.SetTools(tool_list)
+    operation.SetRunParallel(True)
+    note_native_threads()
+    operation.Build()
+    # HasErrors is not exposed by every OCP version
+    has_errors = getattr(operation, "HasErrors", lambda: False)
+    if not operation.IsDone() or has_errors() or operation.Shape().IsNull():
+        return None
+    return Compound.cast(operation.Shape())
+
+
+def fuse_all(shapes: List[Shape]) -> Optional[Shape]:
+    """Fuse shapes in a single multi-argument fuse, so that the kernel
+    intersects every shape once instead of with a growing intermediate
+    result. Falls back to a balanced tree of pairwise fuses if the kernel
+    fails. Returns None for no shapes, results are not cleaned"""
+    shapes = list(shapes)
+    if len(shapes) <= 1:
+        return shapes[0] if shapes else None
+    fused = _checked_bool_op(BRepAlgoAPI_Fuse(), shapes[:1], shapes[1:])
+    if fused is not None:
+        return fused
+    while len(shapes) > 1:
+        pairs = []
+        for a, b in zip(shapes[::2], shapes[1::2]):
+            fused = _checked_bool_op(BRepAlgoAPI_Fuse(), [a], [b])
+            if fused is None:
+                raise RuntimeError("Fusing shapes failed")
+            pairs.append(fused)
+        shapes = pairs + shapes[len(pairs) * 2:]
+    return shapes[0]
+
+
+def cut_all(shape: Shape, tools: List[Shape]) -> Shape:
+    """Cut all tools from shape in a single multi-tool cut. Falls back to
+    cutting by the fused tools, then to cutting tools one by one, if the
+    kernel fails. Results are not cleaned"""
+    tools = list(tools)
+    if not tools:
+        return shape
+    result = _checked_bool_op(BRepAlgoAPI_Cut(), [shape], tools)
+    if result is None and len(tools) > 1:
+        result = _checked_bool_op(BRepAlgoAPI_Cut(), [shape], [fuse_all(tools)])
+    if result is None:
+        result = shape
+        for tool in tools:
+            result = _checked_bool_op(BRepAlgoAPI_Cut(), [result], [tool])
+            if result is None:
+                raise RuntimeError("Cutting shapes failed")
+    return result
+
+
+# Unify results of CommonPart.make, CommonJoinedPart.post_process and
+# StraightEdgeJoint.join, see set_unify
+_unify = bool(os.environ.get("BD_UNIFY"))
+_unify_stats = dict.fromkeys(
+    ("calls", "faces_before", "faces_after", "edges_before", "edges_after"),
+    0)
+UNIFY_LINEAR_TOLERANCE = 1e-5
+UNIFY_ANGULAR_TOLERANCE = 1e-6
+
+
+def set_unify(enabled: bool = True):
+    """Switch unifying build and join results on or off, off by default
+    unless the BD_UNIFY environment variable is set"""
+    global _unify
+    _unify = enabled
+
+
+def unify_enabled() -> bool:
+    return _unify
+
+
+# Cached builds store unified or raw shapes
+bd_cache.register_setting("unify", unify_enabled)
+
+
+def unify_stats() -> Dict[str, int]:
+    """Calls of unify, and total faces and edges before and after them"""
+    return dict(_unify_stats)
+
+
+def clear_unify_stats():
+    for k in _unify_stats:
+        _unify_stats[k] = 0
+
+
+def topology_counts(shape: Shape) -> Tuple[int, int]:
+    """Number of distinct (faces, edges) of shape"""
+    counts = []
+    for kind in (TopAbs_FACE, TopAbs_EDGE):
+        shapes = TopTools_IndexedMapOfShape()
+        TopExp.MapShapes_s(shape.wrapped, kind, shapes)
+        counts.append(shapes.Extent())
+    return tuple(counts)
+
+
+def unify(shape: Shape, linear_tolerance: float = UNIFY_LINEAR_TOLERANCE,
+          angular_tolerance: float = UNIFY_ANGULAR_TOLERANCE) -> Shape:
+    """Merge faces on the same surface and edges on the same curve, within
+    tolerances, which booleans leave split and which slow down every later
+    boolean, face query and section. Like clean(), which +/- run with
+    exact tolerances, but also for batched booleans run without it.
+    Returns a Part, Sketch or Compound like shape, faces and edges before
+    and after are added to unify_stats and the trace span"""
+    with bd_trace.span("unify") as trace_args:
+        faces, edges = topology_counts(shape)
+        upgrader = ShapeUpgrade_UnifySameDomain(shape.wrapped, True, True,
+                                                True)
+        upgrader.AllowInternalEdges(False)
+        upgrader.SetLinearTolerance(linear_tolerance)
+        upgrader.SetAngularTolerance(angular_tolerance)
+        try:
+            upgrader.Build()
+        except Exception:
+            # Keep the shape as it is, like clean()
+            return shape
+        result = wrap_dim(upgrader.Shape(), shape._dim)
+        result.color = shape.color
+        result.label = shape.label
+        faces_after, edges_after = topology_counts(result)
+        for k, v in (("calls", 1), ("faces_before", faces),
+                     ("faces_after", faces_after), ("edges_before", edges),
+                     ("edges_after", edges_after)):
+            _unify_stats[k] += v
+        if trace_args is not None:
+            trace_args.update(faces=(faces, faces_after),
+                              edges=(edges, edges_after))
+    return result
+
+
+def auto_unify(shape: Shape) -> Shape:
+    """unify(shape) if switched on by set_unify, shape otherwise.
+    Assemblies are left alone, unify would drop their children"""
+    if not _unify or shape.children:
+        return shape
+    return unify(shape)
+
+
 def anchor_to(shape, target_loc, anchor_vec, keep_lcs: bool = True):
     anchored = anchor(shape, anchor_vec, keep_lcs)
     anchored.move(target_loc)
@@ -100,115 +460,24 @@ def connect_to(shape, target, from_vec, to_vec, keep_lcs: bool = True):
 def connect_relatively_to(shape, target, from_vec, to_vec, keep_lcs: bool = True):
     return target.location*anchor_to(shape, bound_loc(target.located(Pos()), to_vec), from_vec, keep_lcs)
 
-def _get_field_default(f):
-    if not isinstance(f.default, _MISSING_TYPE):
-        return f.default
-    if not isinstance(f.default_factory, _MISSING_TYPE):
-        return f.default_factory()
-    raise Exception(f"No default and no default_factory for field {f.name}")
-
-def init_dataclass_from(data_class, obj, param_name_remap={}, *args, **kwargs):
-    '''Initialize dataclass from an exiting dataclass object
-    With remaps and overriding arguments as well'''
-    fields_set = set(f.name for f in fields(data_class))
-    param_dict = dict((param_name_remap.get(k, k), getattr(obj, k)) for k in dir(obj)
-                if k in fields_set
-                )
-    param_dict.update(dict((param_name_remap[k], getattr(obj, k)) for k in param_name_remap))
-    param_dict.update(kwargs)
-    return data_class(*args, **param_dict)
+def _clone(shape):
+    """Shallow copy of shape, not placed in the assembly tree its original
+    may be part of"""
+    # copy() of a Shape deep copies its attributes, copy the attribute
+    # dict instead so that parts and sketches are shared. Tree links of
+    # anytree's NodeMixin, which shapes derive from, are left out
+    new = type(shape).__new__(type(shape))
+    new.__dict__.update({k: v for k, v in shape.__dict__.items()
+                         if k not in ("_NodeMixin__parent",
+                                      "_NodeMixin__children")})
+    return new
+
 
 def rdeq(op1, op2, ndigits=3):
     '''Helper for doing rounded equal checks'''
     return round(op1, ndigits) == round(op2, ndigits)
 
 
-class CommonCLI(object):
-    def __init__(self,
-                 obj_class: Type,
-                 extra_arg_config: dict = {},
-                 parser: ArgumentParser = ArgumentParser(
-                     formatter_class=ArgumentDefaultsHelpFormatter,
-                     conflict_handler='resolve'),
-                 args: List[Any] = [],
-                 override_conflict_args: bool = False,
-                 ):
-        self._obj = None
-        self._obj_class = obj_class
-        self._parser = parser
-        self._unparsed_args = args
-
-        def get_aliases(name): return extra_arg_config.get(
-            name, {}).get("aliases", [])
-
-        def get_extra(name): return {
-            k: extra_arg_config[k] for k in extra_arg_config.get(name, {}) if k != "aliases"}
-
-        for f in fields(self._obj_class):
-            if f.metadata.get("no_CLI"):
-                continue
-            aliases = get_aliases(f.name)
-            extra = copy(get_extra(f.name))
-            if isinstance(f.default, _MISSING_TYPE) and \
-                isinstance(f.default_factory, _MISSING_TYPE):
-                self._parser.add_argument(f.name, type=f.type, *aliases, **extra)
-            else:
-                if not "default" in extra:
-                    extra["default"] = _get_field_default(f)
-                if not "help" in extra:
-                    extra["help"] = f.name
-                self._parser.add_argument(f"--{f.name}", type=f.type, *aliases, **extra)
-
-        self.add_output_argument()
-    
-    def add_output_argument(self):
-        self._parser.add_argument(
-            "-o", "--output", help="Output file to write to, if omitted, output will be disabled")
-
-    def parse_args(self, extra_args: Optional[List[Any]] = None):
-        _args = self._parser.parse_args(self._unparsed_args + extra_args)
-        return _args
-    
-    def _get_init_args(self):
-        init_args = {f.name: getattr(self._args, (f.name)) for f in fields(
-            self._obj_class) if f.name in self._args}
-        init_non_args = {f.name: _get_field_default(f) for f in fields(
-            self._obj_class) if not f.name in self._args}
-        init_args.update(init_non_args)
-        return init_args
-
-    def make(self):
-        if self._obj is None:
-            self._obj = self._obj_class(**self._get_init_args())
-        return self._obj
-    
-    def remake_with_args(self, args):
-        _args = self.parse_args(args)
-        if hasattr(self, "_args") and _args == self._args:
-            return self.make()
-        self._args = _args
-
-        self.clear_cached()
-        return self.make()
-
-    # Clear cached object to force remake
-    def clear_cached(self):
-        self._obj = None
-
-    def save_output(self):
-        raise NotImplemented
-
-    @property
-    def output_is_set(self):
-        return not self._args.output is None
-
-    def main(self):
-        self.clear_cached()
-
-        self._args = self.parse_args(sys.argv[1:])
-        if self.output_is_set:
-            self.save_output()
-    
 @dataclass(kw_only=True)
 class CommonPart(BasePartObject):
     rotation: RotationLike = (0, 0, 0)
@@ -216,8 +485,21 @@ class CommonPart(BasePartObject):
     mode: Mode = Mode.SUBTRACT
     main_part: Optional[Part] = None
 
+    # Set to True in subclasses whose make() only depends on field values
+    # to allow storing builds in the geometry cache, see bd_cache
+    cacheable = False
+    # Shape attributes set by _make() to store in the geometry cache.
+    # Cache hits do not run make(), so it must not set other attributes
+    cached_attrs = ("main_part",)
+
     def make(self) -> Part:
         raise NotImplementedError
+
+    def cache_globals(self) -> Dict[str, Any]:
+        '''Values of process-wide settings make() may read, keying
+        cached builds, see bd_cache.register_setting. Extend it in
+        subclasses reading other globals'''
+        return bd_cache.settings()
     
     def init_params(self):
         '''Override this method in subclasses to initialize
@@ -225,20 +507,25 @@ class CommonPart(BasePartObject):
         return
 
     def __post_init__(self):
-        self.init_params()
-        self._make()
+        with bd_trace.span(f"{type(self).__name__}.init_params"):
+            self.init_params()
+        bd_cache.cached_make(self)
         super().__init__(self.main_part, rotation=self.rotation,
                          align=self.align, mode=self.mode)
     
     def _make(self):
         if not self.main_part:
-            self.main_part = self.make()
+            with bd_trace.span(f"{type(self).__name__}.make"):
+                self.main_part = auto_unify(self.make())
 
     def wrap(self, wrapped: Part):
-        param = dict((f.name, getattr(self, f.name))
-                     for f in fields(self.__class__))
-        param["main_part"] = wrapped
-        new = self.__class__(**param)
+        '''Copy of self, keeping parameters and attributes set by
+        init_params and make, with wrapped as its shape. Nothing is made
+        again, so wrapped is taken as it is'''
+        with bd_trace.span(f"{type(self).__name__}.wrap"):
+            new = _clone(self)
+            new.main_part = wrapped
+            new.wrapped = as_compound(wrapped.wrapped)
         return new
 
 @dataclass(kw_only=True)
@@ -253,23 +540,33 @@ class CommonJoinedPart(CommonPart):
         raise NotImplementedError
 
     def _make(self):
+        name = type(self).__name__
         if not self.positive_parts and not self.negative_parts:
-            self.positive_parts, self.negative_parts = self.make()
+            with bd_trace.span(f"{name}.make"):
+                self.positive_parts, self.negative_parts = self.make()
         if not self.main_part:
-            self.main_part = Part() + self.positive_parts - self.negative_parts
-            self.post_process()
+            with bd_trace.span(f"{name}.join"):
+                self.main_part = self.join_subparts()
+            with bd_trace.span(f"{name}.post_process"):
+                self.post_process()
+            self.main_part = auto_unify(self.main_part)
     
+    def join_subparts(self) -> Part:
+        '''Union of positives minus union of negatives, as one fuse and
+        one cut rather than a chain of pairwise booleans'''
+        joined = fuse_all(self.positive_parts)
+        if joined is None:
+            return Part()
+        joined = cut_all(joined, self.negative_parts)
+        # clean() works in place, a single positive part without negatives
+        # comes back as it is and may be shared, e.g. a shared_instance
+        if SkipClean.clean and joined is not self.positive_parts[0]:
+            joined = joined.clean()
+        return Part(joined.wrapped)
+
     def post_process(self):
         '''Post processing after joining, override in subclasses'''
 
-class CommonPartCLI(CommonCLI):
-    def save_output(self):
-        ext = os.path.splitext(self._args.output)[1][1:]
-        if not hasattr(exporters3d, f"export_{ext}"):
-            raise ValueError("Unknown output file type")
-        export_func = getattr(exporters3d, f"export_{ext}")
-        export_func(self.make(), self._args.output)
-
 @dataclass(kw_only=True)
 class CommonSketch(BaseSketchObject):
     rotation: RotationLike = (0, 0, 0)
@@ -277,28 +574,40 @@ class CommonSketch(BaseSketchObject):
     mode: Mode = Mode.SUBTRACT
     main_sketch: Optional[Sketch] = None
 
+    # See CommonPart
+    cacheable = False
+    cached_attrs = ("main_sketch",)
+
     def make(self):
         raise NotImplementedError
 
+    def cache_globals(self) -> Dict[str, Any]:
+        '''See CommonPart.cache_globals'''
+        return bd_cache.settings()
+
     def init_params(self):
         '''Override this method in subclasses to initialize
         all indirect parameters'''
         return
 
     def __post_init__(self):
-        self.init_params()
-        self._make()
+        with bd_trace.span(f"{type(self).__name__}.init_params"):
+            self.init_params()
+        bd_cache.cached_make(self)
         super().__init__(self.main_sketch, rotation=self.rotation,
                          align=self.align, mode=self.mode)
 
     def _make(self):
         if not self.main_sketch:
-            self.main_sketch = self.make()
+            with bd_trace.span(f"{type(self).__name__}.make"):
+                self.main_sketch = self.make()
 
     def wrap(self, wrapped: Sketch):
-        param = dict(getattr(self, f.name) for f in fields(self.__class__))
-        param["main_sketch"] = wrapped
-        new = self.__class__(**param)
+        '''See CommonPart.wrap'''
+        with bd_trace.span(f"{type(self).__name__}.wrap"):
+            new = _clone(self)
+            new.main_sketch = wrapped
+            new.wrapped = as_compound(wrapped.wrapped)
         return new
 
 @dataclass(kw_only=True)
@@ -320,7 +629,8 @@ class CommonAssembly(Compound):
         return
 
     def __post_init__(self):
-        self.init_params()
+        with bd_trace.span(f"{type(self).__name__}.init_params"):
+            self.init_params()
         self._make()
         children = [(copy(m), n) for m, n in self.children_specs]
         for m, n in children:
@@ -330,56 +640,10 @@ class CommonAssembly(Compound):
     
     def _make(self):
         if not self.children_specs:
-            self.children_specs = self.make()
-
-
-
-class CommonAssemblyCLI(CommonCLI):
-    def add_output_argument(self):
-        self._parser.add_argument(
-            "-o", "--output_prefix",
-            help="Output filename prefixes to write to, if omitted, output will be disabled")
-        self._parser.add_argument(
-            "-t", "--output_types",
-            choices=["stl", "step", "combined_step"],
-            default="stl",
-            help="Type of output files to write")
-        self._parser.add_argument(
-            "-C", "--no_custom_saves",
-            default=False, action="store_true",
-            help="Disable custom saves as defined by children assemblies")
-    @property
-    def output_is_set(self):
-        return not self._args.output_prefix is None
-
-    def remake_children_with_args(self, args):
-        _args = self.parse_args(args)
-        if hasattr(self, "_args") and _args == self._args:
-            self.make()
-            return dict((k, v) for v, k in self._obj.children_specs)
-        self._args = _args
-
-        self.clear_cached()
-        self.make()
-        return dict((k, v) for v, k in self._obj.children_specs)
-
-    def save_output(self):
-        out_type = self._args.output_types
-        if not self._args.no_custom_saves:
-            for (obj, name) in self.make().children_specs:
-                if hasattr(obj, "custom_save_func") and not (obj.custom_save_func is None):
-                    obj.custom_save_func(obj, f"{self._args.output_prefix}_{name}")
-        if out_type == "combined_step":
-            exporters3d.export_step(self.make(), f"{self._args.output_prefix}.step")
-        else:
-            if not hasattr(exporters3d, f"export_{out_type}"):
-                raise ValueError("Unknown output file type")
-            export_func = getattr(exporters3d, f"export_{out_type}")
-            for (obj, name) in self.make().children_specs:
-                if name is None:
-                    continue
-                export_func(obj,
-                    f"{self._args.output_prefix}_{name}.{out_type}")
+            with bd_trace.span(f"{type(self).__name__}.make"):
+                self.children_specs = self.make()
+
+
 
 class NutTrapType(Enum):
     SIDE = 1
@@ -393,11 +657,15 @@ class NutTrap(CommonPart):
     tolerance: float = 0.15
     floating_mask: bool = True
 
-    def make(self):
+    cacheable = True
+
+    def init_params(self):
         if not self.spec in cad_common.nut:
             raise NotImplementedError
         self.r = cad_common.nut.get(self.spec).d / 2 + self.tolerance
         self.h = cad_common.nut.get(self.spec).h + 2 * self.tolerance
+
+    def make(self):
         nut_cross = RegularPolygon(self.r, 6)
         nut = extrude(nut_cross, self.h)
         if self.trap_type == NutTrapType.SIDE:
@@ -440,11 +708,89 @@ class FloatingHoleBridgeMask(CommonPart):
         return first_mask + second_mask
 
 
+class ScrewHeadType(Enum):
+    NONE = 1
+    COUNTERBORE = 2
+    COUNTERSINK = 3
+
+@dataclass
+class ScrewHole(CommonPart):
+    '''Screw clearance hole going down from the origin, with an optional
+    counterbore or countersink for the head'''
+    spec: str = "m3"
+    depth: float = 10.0
+    fit: str = "medium"
+    head_type: ScrewHeadType = ScrewHeadType.NONE
+
+    cacheable = True
+
+    def init_params(self):
+        if not self.spec in cad_common.screw:
+            raise NotImplementedError
+        screw = cad_common.screw.get(self.spec)
+        self.r = screw.clearance_hole_d.get(self.fit) / 2
+        if self.head_type == ScrewHeadType.COUNTERBORE:
+            if not "counter_bore" in screw:
+                raise NotImplementedError
+            self.head_r = screw.counter_bore.d / 2
+            self.head_h = screw.counter_bore.l
+        elif self.head_type == ScrewHeadType.COUNTERSINK:
+            if not "countersink_d" in screw:
+                raise NotImplementedError
+            self.head_r = screw.countersink_d / 2
+            self.head_h = (self.head_r - self.r) / math.tan(
+                math.radians(cad_common.screw.countersink_angle / 2))
+
+    def make(self):
+        top = (Align.CENTER, Align.CENTER, Align.MAX)
+        hole = Cylinder(self.r, self.depth, align=top)
+        if self.head_type == ScrewHeadType.COUNTERBORE:
+            hole += Cylinder(self.head_r, self.head_h, align=top)
+        elif self.head_type == ScrewHeadType.COUNTERSINK:
+            hole += Cone(self.r, self.head_r, self.head_h, align=top)
+        return hole
+
+
+def nut_traps(locations: Iterable[Location], **nut_trap_args) -> Part:
+    '''NutTrap tools at every location, sharing a single tool body made
+    once per distinct set of arguments and of layer_height and line_width,
+    which its bridge mask reads, see shared_instance.
+    Subtract the result, or cut several with cut_tools'''
+    return instance_compound(shared_instance(NutTrap, **nut_trap_args),
+                             locations)
+
+
+def screw_holes(locations: Iterable[Location], **screw_hole_args) -> Part:
+    '''ScrewHole tools at every location, see nut_traps'''
+    return instance_compound(shared_instance(ScrewHole, **screw_hole_args),
+                             locations)
+
+
+def cut_tools(host: Union[Part, Sketch], *tools: Union[Part, Sketch]):
+    '''Subtract all tools, e.g. from nut_traps and screw_holes, from host
+    in one batched cut, returns a Part or Sketch like host'''
+    # Instances may overlap each other, which is only valid between
+    # separate operands, not within one compound
+    operands = []
+    for tool in tools:
+        if not isinstance(tool.wrapped, TopoDS_Compound):
+            operands.append(tool)
+            continue
+        it = TopoDS_Iterator(tool.wrapped)
+        while it.More():
+            operands.append(wrap_dim(it.Value(), tool._dim))
+            it.Next()
+    result = cut_all(host, operands)
+    if SkipClean.clean:
+        result = result.clean()
+    return wrap_dim(result.wrapped, host._dim)
+
+
 def lay_cut_board(board_part: Part):
     """Lay down a board on XY Plane, aligning center to origin and
     rotating the shortest bounding box direction of the part towards
     the Z Axis"""
-    b = board_part.bounding_box()
+    b = shape_bbox(board_part)
     axis_to_rot, _ = min((
         ("Y", b.size.X), ("X", b.size.Y), (None, b.size.Z)),
         key=lambda x: x[1])
@@ -455,13 +801,53 @@ def lay_cut_board(board_part: Part):
 
 
 def section_board(board_part: Part):
-    """Section a board to get 2D layout, keeps labels from input"""
-    laid = lay_cut_board(board_part)
-    sk = section(laid, Plane.XY)
+    """Section a board to get 2D layout, keeps labels from input.
+    Boards that keep their own 2D profile (see LCBoard.laid_profile) are
+    exported from it directly"""
+    sk = None
+    if hasattr(board_part, "laid_profile"):
+        sk = board_part.laid_profile()
+    if sk is None:
+        laid = lay_cut_board(board_part)
+        sk = section(laid, Plane.XY)
     sk.label = board_part.label
     return sk
 
 
+def section_boards(boards: Iterable[Part], jobs: int = 1) -> List[Sketch]:
+    """section_board of every board, in up to jobs forked processes, see
+    map_forked. Sections are passed back as BREP"""
+    boards = list(boards)
+    if jobs <= 1:
+        return [section_board(b) for b in boards]
+
+    def section_brep(i):
+        stream = io.BytesIO()
+        BRepTools.Write_s(section_board(boards[i]).wrapped, stream)
+        return stream.getvalue()
+    breps = map_forked(section_brep, range(len(boards)), jobs)
+    sections = []
+    for board, brep in zip(boards, breps):
+        wrapped = TopoDS_Shape()
+        BRepTools.Read_s(wrapped, io.BytesIO(brep), BRep_Builder())
+        sk = Sketch(wrapped)
+        sk.label = board.label
+        sections.append(sk)
+    return sections
+
+
+def lay_out_row(sketches: List[Sketch], spacing: float = 5) -> List[Sketch]:
+    """Location-only copies of sketches placed left to right along X with
+    spacing between their bounding boxes, keeping labels"""
+    placed = []
+    x = 0
+    for sk in sketches:
+        bb = sk.bounding_box()
+        placed.append(place(sk, Pos(X=x - bb.min.X)))
+        x += bb.size.X + spacing
+    return placed
+
+
 def color_parts(part_list: List[Part], hsv):
     """Color part list with different colors
     hsv is a tuple of tuples:
@@ -499,28 +885,86 @@ def color_parts_shade(part_list, hue=0.12, sat_bnd=0.4, val_bnd=0.7):
         p.color = Color(*colorsys.hsv_to_rgb(*color))
 
 
-def save_dxf(cut, fn):
-    exporter = ExportDXF(unit=Unit.MM, line_weight=0.5)
+def _export_cut(exporter, cut, fn, dedupe_tolerance: Optional[float],
+                order: bool):
+    layers, report = bd_cutpath.prepare_cuts([cut], dedupe_tolerance, order)
     exporter.add_layer("Layer 1")
-    exporter.add_shape(cut, layer="Layer 1")
+    exporter.add_shape([s for shapes in layers.values() for s in shapes],
+                       layer="Layer 1")
     exporter.write(fn)
-
-
-def save_svg(cut, fn):
-    exporter = ExportSVG(unit=Unit.MM, line_weight=0.5)
-    exporter.add_layer("Layer 1")
-    exporter.add_shape(cut, layer="Layer 1")
+    return report
+
+
+@bd_trace.traced()
+def save_dxf(cut, fn, dedupe_tolerance: Optional[float] = None,
+             order: bool = False):
+    """Write cut to fn. If dedupe_tolerance is given, shared line segments,
+    e.g. of packed boards, are cut once, if order is set, paths are
+    written in an order that reduces rapid travel. Either returns a
+    CutReport, see bd_cutpath.prepare_cuts"""
+    return _export_cut(ExportDXF(unit=Unit.MM, line_weight=0.5), cut, fn,
+                       dedupe_tolerance, order)
+
+
+@bd_trace.traced()
+def save_svg(cut, fn, dedupe_tolerance: Optional[float] = None,
+             order: bool = False):
+    """Write cut to fn, see save_dxf"""
+    return _export_cut(ExportSVG(unit=Unit.MM, line_weight=0.5), cut, fn,
+                       dedupe_tolerance, order)
+
+
+@bd_trace.traced()
+def save_layers(cuts: Iterable[Sketch], fn,
+                dedupe_tolerance: Optional[float] = None,
+                order: bool = False) -> Optional[bd_cutpath.CutReport]:
+    """Write cuts into a single .svg or .dxf file in one exporter pass,
+    one layer per label. See save_dxf for dedupe_tolerance and order"""
+    ext = os.path.splitext(fn)[1].lower()
+    if ext == ".svg":
+        exporter = ExportSVG(unit=Unit.MM, line_weight=0.5)
+    elif ext == ".dxf":
+        exporter = ExportDXF(unit=Unit.MM, line_weight=0.5)
+    else:
+        raise ValueError(f"Unknown output file type {ext}")
+    layers, report = bd_cutpath.prepare_cuts(cuts, dedupe_tolerance, order)
+    for layer, shapes in layers.items():
+        exporter.add_layer(layer)
+        exporter.add_shape(shapes, layer=layer)
     exporter.write(fn)
+    return report
 
 
+@bd_trace.traced()
 def save_stl(part: Part, fn):
     part.export_stl(fn)
 
 
-def export_assembled_projected_svg(assembly: Compound, prefix: str):
-    children = map(section_board, assembly.children)
-    for child in children:
-        save_svg(child, f"{prefix}{child.label}.svg")
+def _save_board_svg(board_part: Part, fn, order: bool):
+    save_svg(section_board(board_part), fn, order=order)
+
+
+@bd_trace.traced()
+def export_assembled_projected_svg(assembly: Compound, prefix: str,
+                                   jobs: int = 1,
+                                   combined: Optional[str] = None,
+                                   spacing: float = 5,
+                                   dedupe_tolerance: Optional[float] = None,
+                                   order: bool = False
+                                   ) -> Optional[bd_cutpath.CutReport]:
+    """Section every child board of assembly and write one SVG per board
+    to prefix + label, in up to jobs forked processes.
+    If combined, an .svg or .dxf file name, write all boards laid out in
+    a row spacing apart into it instead, one layer per label. With
+    spacing 0, boards share edges that are cut once if dedupe_tolerance
+    is given. See save_dxf for dedupe_tolerance and order"""
+    if combined:
+        boards = section_boards(assembly.children, jobs)
+        return save_layers(lay_out_row(boards, spacing), combined,
+                           dedupe_tolerance, order)
+    run_save_tasks([(child.label, _save_board_svg,
+                     (child, f"{prefix}{child.label}.svg", order))
+                    for child in assembly.children], jobs)
 
 
 def label_objects(object_names: List[str], source):
@@ -558,7 +1002,35 @@ class StraightEdgeJoint(CommonPart):
         Returning None means no receptacle to be added"""
         return None
 
-    def join(self, male, female, plane, count, distance=None, spread=None):
+    def join_tools(self, plane, count, distance=None, spread=None):
+        """Returns the (positive, negative, receptacle) tools of join placed
+        at every joint location, each as a single compound.
+        receptacle is None if there is no receptacle part"""
+        if distance is None:
+            distance = spread/count
+        locs = [plane.location * loc for loc in
+                GridLocations(distance, 0, count, 1)]
+        rec = self.get_receptacle()
+        return (instance_compound(self, locs),
+                instance_compound(self.get_negative(), locs),
+                instance_compound(rec, locs) if rec != None else None)
+
+    @bd_trace.traced()
+    def join(self, male, female, plane, count, distance=None, spread=None,
+             batched=False):
+        """Join male and female with count joints along the X direction of
+        plane, either distance apart or evenly spread over a length.
+        Returns the joined (male, female) parts.
+        When batched, each tool is made once and all of its instances are
+        applied in a single boolean operation, see tests/test_joints.py
+        for the check that both ways cut the same profiles"""
+        if batched:
+            pos, neg, rec = self.join_tools(plane, count, distance, spread)
+            m_part = male + pos
+            f_part = female - neg
+            if rec != None:
+                f_part += rec
+            return (auto_unify(m_part), auto_unify(f_part))
         if distance is None:
             distance = spread/count
         m_part = male + \
@@ -571,7 +1043,7 @@ class StraightEdgeJoint(CommonPart):
         if rec != None:
             f_part += [plane * loc * self.get_receptacle() for loc in
                        GridLocations(distance, 0, count, 1)]
-        return (m_part, f_part)
+        return (auto_unify(m_part), auto_unify(f_part))
 
 
 class StraightFingerJoint(StraightEdgeJoint):
@@ -0,0 +1,379 @@
+"""Cut path processing for laser-cut exports.
+
+Boards packed side by side share outline edges, which the cutter would
+otherwise cut twice. dedupe_cuts() finds coincident or overlapping
+collinear line segments across sketches, within a tolerance, and merges
+them into single cuts. Note that parts sharing a cut also share the
+kerf, space them apart instead where the kerf matters.
+
+order_cuts() chains edges into continuous paths and orders them to
+reduce rapid travel between them, cutting inner contours before the
+contours around them so that parts do not drop out of the sheet first.
+prepare_cuts() runs both stages for the exporters in bd_common."""
+from build123d import Edge, GeomType, Vector, Wire
+from OCP.BRep import BRep_Tool
+from OCP.BRepBuilderAPI import BRepBuilderAPI_MakeWire
+from OCP.TopExp import TopExp
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+import math
+
+# Edge ends closer than this are chained into one path
+CHAIN_TOLERANCE = 1e-3
+# Passes of 2-opt improvement over each group of paths
+TWO_OPT_PASSES = 8
+
+
+@dataclass
+class CutReport:
+    """Cut lengths before and after merging, and estimated rapid travel
+    before and after ordering if cuts were ordered, in mm"""
+    total_length: float
+    cut_length: float
+    travel_before: Optional[float] = None
+    travel_after: Optional[float] = None
+
+    @property
+    def saved_length(self) -> float:
+        return self.total_length - self.cut_length
+
+    def __str__(self):
+        saved = self.saved_length
+        ratio = saved / self.total_length if self.total_length else 0
+        text = (f"cut length {self.cut_length:.1f} mm, saved {saved:.1f} mm "
+                f"({ratio:.1%}) of {self.total_length:.1f} mm")
+        if self.travel_after is not None:
+            text += (f", travel {self.travel_after:.1f} mm, was "
+                     f"{self.travel_before:.1f} mm")
+        return text
+
+
+def _chain_clusters(items: list, key, tolerance: float) -> List[list]:
+    """Split items, sorted by key, where consecutive keys differ by more
+    than tolerance"""
+    clusters = []
+    for item in sorted(items, key=key):
+        if clusters and key(item) - key(clusters[-1][-1]) <= tolerance:
+            clusters[-1].append(item)
+        else:
+            clusters.append([item])
+    return clusters
+
+
+def _merge_collinear(segments: list, tolerance: float) -> List[tuple]:
+    """Merge (theta, a, b, layer, edge) segments of about the same
+    direction, returns (edge, layer) of single segments and
+    ((start, end), layer) of merged ones"""
+    theta = sum(s[0] for s in segments) / len(segments)
+    ux, uy = math.cos(theta), math.sin(theta)
+    # (offset along normal, start, end, segment) along direction theta
+    lines = []
+    for segment in segments:
+        _, a, b, _, _ = segment
+        offset = (a[1] + b[1]) / 2 * ux - (a[0] + b[0]) / 2 * uy
+        s0, s1 = sorted((a[0] * ux + a[1] * uy, b[0] * ux + b[1] * uy))
+        lines.append((offset, s0, s1, segment))
+    merged = []
+    for line in _chain_clusters(lines, lambda l: l[0], tolerance):
+        offset = sum(l[0] for l in line) / len(line)
+        runs = []
+        for _, s0, s1, segment in sorted(line, key=lambda l: l[1]):
+            if runs and s0 <= runs[-1][1] + tolerance:
+                runs[-1][1] = max(runs[-1][1], s1)
+                runs[-1][2].append(segment)
+            else:
+                runs.append([s0, s1, [segment]])
+        for s0, s1, run in runs:
+            layer = run[0][3]
+            if len(run) == 1:
+                merged.append((run[0][4], layer))
+                continue
+            merged.append((((s0 * ux - offset * uy, s0 * uy + offset * ux),
+                            (s1 * ux - offset * uy, s1 * uy + offset * ux)),
+                           layer))
+    return merged
+
+
+def dedupe_cuts(cuts: Iterable, tolerance: float = 0.01
+                ) -> Tuple[Dict[str, List[Edge]], CutReport]:
+    """Edges of sketches on the XY plane by layer, their labels, with
+    coincident or overlapping collinear line segments merged into one.
+    A merged segment goes to the layer of its first part along the line.
+    Other edges are kept as they are"""
+    layers: Dict[str, List[Edge]] = {}
+    segments = []
+    total = 0
+    for cut in cuts:
+        layer = cut.label or "Layer 1"
+        edges = layers.setdefault(layer, [])
+        for edge in cut.edges():
+            total += edge.length
+            if edge.geom_type != GeomType.LINE:
+                edges.append(edge)
+                continue
+            a, b = edge.position_at(0), edge.position_at(1)
+            theta = math.atan2(b.Y - a.Y, b.X - a.X) % math.pi
+            segments.append((theta, (a.X, a.Y), (b.X, b.Y), layer, edge))
+    if segments:
+        longest = max(math.dist(s[1], s[2]) for s in segments)
+        angle_tolerance = tolerance / max(longest, tolerance)
+        # Directions just below pi are the same as just above 0
+        segments = [(s[0] - math.pi if s[0] > math.pi - angle_tolerance
+                      else s[0],) + s[1:] for s in segments]
+        for group in _chain_clusters(segments, lambda s: s[0],
+                                     angle_tolerance):
+            for merged, layer in _merge_collinear(group, tolerance):
+                if isinstance(merged, tuple):
+                    merged = Edge.make_line(Vector(*merged[0]),
+                                            Vector(*merged[1]))
+                layers[layer].append(merged)
+    cut_length = sum(e.length for edges in layers.values() for e in edges)
+    return layers, CutReport(total, cut_length)
+
+
+def _ends(edge: Edge) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """Start and end of edge in its orientation"""
+    first = BRep_Tool.Pnt_s(TopExp.FirstVertex_s(edge.wrapped, True))
+    last = BRep_Tool.Pnt_s(TopExp.LastVertex_s(edge.wrapped, True))
+    return (first.X(), first.Y()), (last.X(), last.Y())
+
+
+def _reversed(edge: Edge) -> Edge:
+    return Edge(edge.wrapped.Reversed())
+
+
+@dataclass
+class _Path:
+    """Chained edges, as (index, reversed) pairs, from start to end"""
+    edges: List[Tuple[int, bool]]
+    start: Tuple[float, float]
+    end: Tuple[float, float]
+    closed: bool
+
+
+def _chain(ends: list, tolerance: float) -> List[_Path]:
+    """Chain edges with the given (start, end) points into paths"""
+    def key(p):
+        return (round(p[0] / tolerance), round(p[1] / tolerance))
+    at_point = defaultdict(list)
+    for i, (a, b) in enumerate(ends):
+        at_point[key(a)].append(i)
+        at_point[key(b)].append(i)
+    used = [False] * len(ends)
+
+    def take(point):
+        for j in at_point[key(point)]:
+            if not used[j]:
+                used[j] = True
+                return j
+        return None
+
+    paths = []
+    for i in range(len(ends)):
+        if used[i]:
+            continue
+        used[i] = True
+        path = [(i, False)]
+        start, end = ends[i]
+        while key(end) != key(start):
+            j = take(end)
+            if j is None:
+                break
+            rev = key(ends[j][0]) != key(end)
+            path.append((j, rev))
+            end = ends[j][0] if rev else ends[j][1]
+        while key(end) != key(start):
+            j = take(start)
+            if j is None:
+                break
+            rev = key(ends[j][1]) != key(start)
+            path.insert(0, (j, rev))
+            start = ends[j][1] if rev else ends[j][0]
+        paths.append(_Path(path, start, end, key(start) == key(end)))
+    return paths
+
+
+def _depths(boxes: np.ndarray, closed: np.ndarray) -> np.ndarray:
+    """Number of closed paths whose (min_x, min_y, max_x, max_y) box
+    contains the box of each path"""
+    depths = np.zeros(len(boxes), dtype=int)
+    for i in np.flatnonzero(closed):
+        b = boxes[i]
+        inside = (boxes[:, 0] >= b[0]) & (boxes[:, 1] >= b[1]) & \
+            (boxes[:, 2] <= b[2]) & (boxes[:, 3] <= b[3])
+        inside[i] = False
+        # Identical boxes, e.g. of deduplicated outlines, do not nest
+        inside &= (boxes != b).any(axis=1)
+        depths += inside
+    return depths
+
+
+def _nearest_neighbour(paths: List[_Path], ends: list, position
+                       ) -> List[Tuple[_Path, int, bool]]:
+    """Greedy order of paths from position, as (path, rotation, reversed).
+    Closed paths may start at any of their edges, open paths at either
+    end"""
+    points, owners = [], []
+    for n, path in enumerate(paths):
+        if path.closed:
+            for r, (i, rev) in enumerate(path.edges):
+                points.append(ends[i][1] if rev else ends[i][0])
+                owners.append((n, r, False))
+        else:
+            points += [path.start, path.end]
+            owners += [(n, 0, False), (n, 0, True)]
+    points = np.array(points)
+    owner_paths = np.array([o[0] for o in owners])
+    alive = np.ones(len(points), dtype=bool)
+    order = []
+    for _ in range(len(paths)):
+        candidates = np.flatnonzero(alive)
+        d = ((points[candidates] - position) ** 2).sum(axis=1)
+        best = candidates[np.argmin(d)]
+        n, r, rev = owners[best]
+        order.append((paths[n], r, rev))
+        alive &= owner_paths != n
+        if paths[n].closed:
+            position = points[best]
+        else:
+            position = np.array(paths[n].start if rev else paths[n].end)
+    return order
+
+
+def _two_opt(entries: np.ndarray, exits: np.ndarray, position) -> np.ndarray:
+    """Improve an order of paths with given entry and exit points from
+    position by reversing runs of it, returns the new order of indices,
+    negative, as ~index, for paths to traverse reversed"""
+    n = len(entries)
+    order = np.arange(n)
+    flipped = np.zeros(n, dtype=bool)
+    p, q = entries.copy(), exits.copy()
+    for _ in range(TWO_OPT_PASSES):
+        improved = False
+        for i in range(n):
+            a = q[i - 1] if i > 0 else position
+            # Reversing i..j joins a to q[j] and p[i] to p[j + 1]
+            d_new = np.linalg.norm(q[i:] - a, axis=1)
+            d_old = np.linalg.norm(q[i:] - np.vstack((p[i + 1:], q[-1:])),
+                                   axis=1)
+            d_new[:-1] += np.linalg.norm(p[i + 1:] - p[i], axis=1)
+            d_old[-1] = 0
+            delta = d_new - d_old - np.linalg.norm(p[i] - a)
+            j = i + int(np.argmin(delta))
+            if delta[j - i] < -1e-9:
+                order[i:j + 1] = order[i:j + 1][::-1].copy()
+                flipped[i:j + 1] = ~flipped[i:j + 1][::-1]
+                p[i:j + 1], q[i:j + 1] = \
+                    q[i:j + 1][::-1].copy(), p[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return np.where(flipped, ~order, order)
+
+
+def _travel(points: List[Tuple[tuple, tuple]], position) -> float:
+    """Rapid travel from position through (start, end) pairs in order"""
+    travel = 0
+    for start, end in points:
+        travel += math.dist(position, start)
+        position = end
+    return travel
+
+
+def _path_shape(edges: List[Edge]) -> Union[Wire, List[Edge]]:
+    """Wire of chained edges, or the edges if they do not form one"""
+    builder = BRepBuilderAPI_MakeWire()
+    for e in edges:
+        builder.Add(e.wrapped)
+    if builder.IsDone():
+        return Wire(builder.Wire())
+    return edges
+
+
+def order_cuts(edges: List[Edge], position=None
+               ) -> Tuple[List[Union[Wire, Edge]], float, float, tuple]:
+    """Chain edges into paths and order them to reduce rapid travel from
+    position, the lower left corner of the edges by default. Paths inside
+    other closed paths come first, each nesting level is ordered by
+    nearest neighbour, then improved by 2-opt.
+    Returns wires, or edges that could not be chained into a wire, in
+    cutting order, the travel before and after ordering and the end
+    position"""
+    if not edges:
+        return [], 0, 0, position
+    ends = [_ends(e) for e in edges]
+    if position is None:
+        xs = [p[0] for pair in ends for p in pair]
+        ys = [p[1] for pair in ends for p in pair]
+        position = (min(xs), min(ys))
+    before = _travel(ends, position)
+    start = position
+    paths = _chain(ends, CHAIN_TOLERANCE)
+    boxes = []
+    for path in paths:
+        bbs = [edges[i].bounding_box() for i, _ in path.edges]
+        boxes.append((min(b.min.X for b in bbs), min(b.min.Y for b in bbs),
+                      max(b.max.X for b in bbs), max(b.max.Y for b in bbs)))
+    depths = _depths(np.array(boxes),
+                     np.array([path.closed for path in paths]))
+    position = np.array(position, dtype=float)
+    shapes, travel_points = [], []
+    for depth in sorted(set(depths.tolist()), reverse=True):
+        level = [path for path, d in zip(paths, depths) if d == depth]
+        ordered = []
+        for path, r, rev in _nearest_neighbour(level, ends, position):
+            oriented = path.edges[r:] + path.edges[:r]
+            if rev:
+                oriented = [(i, not flip) for i, flip in oriented[::-1]]
+            ordered.append(oriented)
+        spans = [(ends[o[0][0]][1] if o[0][1] else ends[o[0][0]][0],
+                  ends[o[-1][0]][0] if o[-1][1] else ends[o[-1][0]][1])
+                 for o in ordered]
+        improved = _two_opt(np.array([s[0] for s in spans]),
+                            np.array([s[1] for s in spans]), position)
+        for k in improved:
+            oriented = ordered[~k if k < 0 else k]
+            span = spans[~k if k < 0 else k]
+            if k < 0:
+                oriented = [(i, not flip) for i, flip in oriented[::-1]]
+                span = span[::-1]
+            travel_points.append(span)
+            shape = _path_shape([_reversed(edges[i]) if flip else edges[i]
+                                 for i, flip in oriented])
+            shapes += shape if isinstance(shape, list) else [shape]
+        position = np.array(travel_points[-1][1])
+    return shapes, before, _travel(travel_points, start), \
+        travel_points[-1][1]
+
+
+def prepare_cuts(cuts: Iterable, dedupe_tolerance: Optional[float] = None,
+                 order: bool = False
+                 ) -> Tuple[Dict[str, list], Optional[CutReport]]:
+    """Shapes to export by layer, the labels of cuts, after the optional
+    dedupe_cuts and order_cuts stages. Layers are ordered one after the
+    other, continuing from where the previous one ended. Returns no
+    report if neither stage runs"""
+    if dedupe_tolerance is None and not order:
+        layers = {}
+        for cut in cuts:
+            layers.setdefault(cut.label or "Layer 1", []).append(cut)
+        return layers, None
+    if dedupe_tolerance is not None:
+        layers, report = dedupe_cuts(cuts, dedupe_tolerance)
+    else:
+        layers = {}
+        for cut in cuts:
+            layers.setdefault(cut.label or "Layer 1", []).extend(cut.edges())
+        length = sum(e.length for edges in layers.values() for e in edges)
+        report = CutReport(length, length)
+    if order:
+        report.travel_before = report.travel_after = 0
+        position = None
+        for layer, edges in layers.items():
+            shapes, before, after, position = order_cuts(edges, position)
+            layers[layer] = shapes
+            report.travel_before += before
+            report.travel_after += after
+    return layers, report
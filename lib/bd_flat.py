@@ -0,0 +1,267 @@
+"""Analytic 2D profiles written directly to SVG and DXF.
+
+A FlatProfile is a rectangle with optionally rounded corners and circle
+or slot holes, the shapes panels like RackPanel are made of. check()
+verifies analytically that every hole lies inside the outline and that
+no two holes overlap, in which case the profile outlines are exactly the
+boundary of the sketch, and writing them needs no kernel booleans.
+Profiles failing the check should be built and exported as sketches.
+
+Sketch classes opt in by defining make_profile(), see flat_profile().
+
+This module does not import build123d, see cad_cli."""
+from dataclasses import dataclass, field, fields
+from typing import List, Optional, Tuple
+from cad_cli import get_field_default
+import bd_trace
+import math
+
+# Minimal gap between holes and the outline, below it holes would merge
+GAP_TOLERANCE = 1e-6
+# Line weight of layers added to ExportSVG and ExportDXF without one, the
+# line_weight given to the exporters only applies to their default layer
+LAYER_LINE_WEIGHT = 0.09
+
+# Edges are ("line", start, end), ("arc", center, radius, start_deg,
+# end_deg) counterclockwise, or ("circle", center, radius)
+Edge = tuple
+
+
+@dataclass
+class RoundedRect:
+    """Rectangle centered on (x, y) with corners rounded by r"""
+    width: float
+    height: float
+    r: float = 0
+    x: float = 0
+    y: float = 0
+
+    def is_valid(self):
+        return self.width > 0 and self.height > 0 and \
+            0 <= self.r < min(self.width, self.height) / 2
+
+    def distance(self, x: float, y: float) -> float:
+        """Signed distance of (x, y) to the boundary, negative inside"""
+        qx = abs(x - self.x) - (self.width / 2 - self.r)
+        qy = abs(y - self.y) - (self.height / 2 - self.r)
+        outside = math.hypot(max(qx, 0), max(qy, 0))
+        return outside + min(max(qx, qy), 0) - self.r
+
+    def edges(self) -> List[Edge]:
+        x0, x1 = self.x - self.width / 2, self.x + self.width / 2
+        y0, y1 = self.y - self.height / 2, self.y + self.height / 2
+        r = self.r
+        corners = [(x1 - r, y0 + r), (x1 - r, y1 - r),
+                   (x0 + r, y1 - r), (x0 + r, y0 + r)]
+        sides = [((x0 + r, y0), (x1 - r, y0)), ((x1, y0 + r), (x1, y1 - r)),
+                 ((x1 - r, y1), (x0 + r, y1)), ((x0, y1 - r), (x0, y0 + r))]
+        edges = []
+        for i, (side, corner) in enumerate(zip(sides, corners)):
+            edges.append(("line",) + side)
+            if r > 0:
+                edges.append(("arc", corner, r, i * 90 - 90, i * 90))
+        return edges
+
+
+@dataclass
+class Stadium:
+    """Slot of radius r around the segment of length 2 * half_length
+    centered on (x, y) at angle degrees, a circle if half_length is 0"""
+    r: float
+    x: float = 0
+    y: float = 0
+    half_length: float = 0
+    angle: float = 0
+
+    def ends(self) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        dx = self.half_length * math.cos(math.radians(self.angle))
+        dy = self.half_length * math.sin(math.radians(self.angle))
+        return (self.x - dx, self.y - dy), (self.x + dx, self.y + dy)
+
+    def x_range(self) -> Tuple[float, float]:
+        (ax, _), (bx, _) = self.ends()
+        return min(ax, bx) - self.r, max(ax, bx) + self.r
+
+    def edges(self) -> List[Edge]:
+        if self.half_length == 0:
+            return [("circle", (self.x, self.y), self.r)]
+        a, b = self.ends()
+        nx = -self.r * math.sin(math.radians(self.angle))
+        ny = self.r * math.cos(math.radians(self.angle))
+        return [
+            ("line", (a[0] - nx, a[1] - ny), (b[0] - nx, b[1] - ny)),
+            ("arc", b, self.r, self.angle - 90, self.angle + 90),
+            ("line", (b[0] + nx, b[1] + ny), (a[0] + nx, a[1] + ny)),
+            ("arc", a, self.r, self.angle + 90, self.angle + 270),
+        ]
+
+
+def _point_segment_distance(p, a, b) -> float:
+    abx, aby = b[0] - a[0], b[1] - a[1]
+    length2 = abx * abx + aby * aby
+    t = 0 if length2 == 0 else \
+        ((p[0] - a[0]) * abx + (p[1] - a[1]) * aby) / length2
+    t = min(max(t, 0), 1)
+    return math.hypot(p[0] - a[0] - t * abx, p[1] - a[1] - t * aby)
+
+
+def _segments_intersect(a, b, c, d) -> bool:
+    def cross(o, p, q):
+        return (p[0] - o[0]) * (q[1] - o[1]) - (p[1] - o[1]) * (q[0] - o[0])
+    d1, d2 = cross(c, d, a), cross(c, d, b)
+    d3, d4 = cross(a, b, c), cross(a, b, d)
+    return ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0))
+
+
+def _segment_distance(a, b, c, d) -> float:
+    if _segments_intersect(a, b, c, d):
+        return 0
+    return min(_point_segment_distance(a, c, d),
+               _point_segment_distance(b, c, d),
+               _point_segment_distance(c, a, b),
+               _point_segment_distance(d, a, b))
+
+
+@dataclass
+class FlatProfile:
+    outline: RoundedRect
+    holes: List[Stadium] = field(default_factory=list)
+
+    def check(self) -> bool:
+        """Whether holes lie strictly inside the outline without
+        overlapping each other"""
+        if not self.outline.is_valid():
+            return False
+        for hole in self.holes:
+            if hole.r <= 0 or hole.half_length < 0:
+                return False
+            # Both are convex, so checking the segment ends suffices
+            if any(self.outline.distance(*p) > -hole.r - GAP_TOLERANCE
+                   for p in hole.ends()):
+                return False
+        # Sweep over x ranges, only holes overlapping in x are compared
+        holes = sorted(self.holes, key=lambda h: h.x_range()[0])
+        ranges = [h.x_range() for h in holes]
+        for i, hole in enumerate(holes):
+            for j in range(i + 1, len(holes)):
+                if ranges[j][0] > ranges[i][1] + GAP_TOLERANCE:
+                    break
+                other = holes[j]
+                if _segment_distance(*hole.ends(), *other.ends()) <= \
+                        hole.r + other.r + GAP_TOLERANCE:
+                    return False
+        return True
+
+    def loops(self) -> List[List[Edge]]:
+        return [self.outline.edges()] + [h.edges() for h in self.holes]
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(min_x, min_y, max_x, max_y) of the outline"""
+        o = self.outline
+        return (o.x - o.width / 2, o.y - o.height / 2,
+                o.x + o.width / 2, o.y + o.height / 2)
+
+    @bd_trace.traced()
+    def write_svg(self, fn: str, line_weight: float = 0.5):
+        """Write outlines in mm, laid out like ExportSVG with
+        fit_to_stroke"""
+        min_x, min_y, max_x, max_y = self.bounds()
+        m = line_weight / 2
+        width, height = max_x - min_x + 2 * m, max_y - min_y + 2 * m
+        elements = []
+        for loop in self.loops():
+            if loop[0][0] == "circle":
+                (x, y), r = loop[0][1:]
+                elements.append(
+                    f'<circle cx="{_fmt(x)}" cy="{_fmt(y)}" r="{_fmt(r)}"/>')
+            else:
+                elements.append(f'<path d="{_svg_path(loop)}"/>')
+        with open(fn, "w") as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                f'<svg xmlns="http://www.w3.org/2000/svg" '
+                f'width="{_fmt(width)}mm" height="{_fmt(height)}mm" '
+                f'viewBox="{_fmt(min_x - m)} {_fmt(-max_y - m)} '
+                f'{_fmt(width)} {_fmt(height)}">\n'
+                '<g transform="scale(1,-1)" stroke-linecap="round">\n'
+                '<g id="Layer 1" fill="none" stroke="rgb(0,0,0)" '
+                f'stroke-width="{_fmt(LAYER_LINE_WEIGHT)}">\n'
+                + "\n".join(elements) + "\n</g>\n</g>\n</svg>\n")
+
+    @bd_trace.traced()
+    def write_dxf(self, fn: str, line_weight: float = 0.5):
+        """Write outlines in mm as lines, arcs and circles, like
+        ExportDXF"""
+        import ezdxf
+        from ezdxf import units
+        doc = ezdxf.new(dxfversion="R2013")
+        doc.units = units.MM
+        doc.layers.get("0").dxf.lineweight = round(line_weight * 100)
+        doc.layers.add("Layer 1", lineweight=round(LAYER_LINE_WEIGHT * 100))
+        msp = doc.modelspace()
+        attribs = {"layer": "Layer 1"}
+        for loop in self.loops():
+            for edge in loop:
+                if edge[0] == "line":
+                    msp.add_line(edge[1], edge[2], dxfattribs=attribs)
+                elif edge[0] == "arc":
+                    msp.add_arc(*edge[1:], dxfattribs=attribs)
+                else:
+                    msp.add_circle(*edge[1:], dxfattribs=attribs)
+        doc.saveas(fn)
+
+    def write(self, fn: str, line_weight: float = 0.5):
+        """Write to fn, an .svg or .dxf file"""
+        ext = fn.rsplit(".", 1)[-1].lower()
+        if ext == "svg":
+            self.write_svg(fn, line_weight)
+        elif ext == "dxf":
+            self.write_dxf(fn, line_weight)
+        else:
+            raise ValueError(f"Unknown output file type {ext}")
+
+
+def _fmt(v: float) -> str:
+    s = f"{v:.6f}".rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+
+def _svg_path(loop: List[Edge]) -> str:
+    commands = []
+    for edge in loop:
+        if edge[0] == "line":
+            start, end = edge[1], edge[2]
+        else:
+            (cx, cy), r, a0, a1 = edge[1:]
+            start = (cx + r * math.cos(math.radians(a0)),
+                     cy + r * math.sin(math.radians(a0)))
+            end = (cx + r * math.cos(math.radians(a1)),
+                   cy + r * math.sin(math.radians(a1)))
+        if not commands:
+            commands.append(f"M {_fmt(start[0])},{_fmt(start[1])}")
+        if edge[0] == "line":
+            commands.append(f"L {_fmt(end[0])},{_fmt(end[1])}")
+        else:
+            large = 1 if (a1 - a0) % 360 > 180 else 0
+            commands.append(f"A {_fmt(r)},{_fmt(r)} 0 {large},1 "
+                            f"{_fmt(end[0])},{_fmt(end[1])}")
+    return " ".join(commands + ["Z"])
+
+
+def flat_profile(cls, **params) -> Optional[FlatProfile]:
+    """FlatProfile of the sketch cls(**params) would make, without making
+    it. Returns None if cls does not define make_profile(), or if the
+    profile fails FlatProfile.check() and needs kernel booleans"""
+    if not hasattr(cls, "make_profile"):
+        return None
+    # Set fields without running __post_init__, which makes the sketch
+    obj = object.__new__(cls)
+    for f in fields(cls):
+        setattr(obj, f.name, params[f.name] if f.name in params
+                else get_field_default(f))
+    if obj.align is not None or tuple(obj.rotation) != (0, 0, 0):
+        return None
+    obj.init_params()
+    with bd_trace.span(f"{cls.__name__}.make_profile"):
+        profile = obj.make_profile()
+    return profile if profile.check() else None
@@ -0,0 +1,177 @@
+"""Cached geometry lookups for attachment faces, joints and anchoring.
+
+face_index(shape) builds a FaceIndex once per shape and location, and
+returns the cached one until the shape is moved or replaced. It holds
+the faces of the shape with their bounding boxes, faces grouped by
+normal axis and sorted along it for k-th face queries, and answers
+nearest face queries by running exact distances only on faces whose
+bounding box could be nearer than the best face found so far.
+
+shape_bbox(shape) caches bounding boxes of the underlying geometry in
+its own frame, shared by all located copies of a shape, and transforms
+them by the current location of the shape, shape_bounds(shapes) does so
+for many shapes at once."""
+from build123d import Axis, BoundBox, Face, Location, Shape, ShapeList
+from OCP.Bnd import Bnd_Box
+from OCP.BRepBndLib import BRepBndLib
+from OCP.TopLoc import TopLoc_Location
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import weakref
+
+# id(shape) -> (copy of shape.wrapped when indexed, FaceIndex)
+_indexes: Dict[int, tuple] = {}
+# (geometry hash, optimal) -> (unlocated shape, (N, 3) box corners)
+_bboxes = OrderedDict()
+BBOX_CACHE_SIZE = 4096
+
+
+def _box(shape) -> Tuple[float, ...]:
+    bb = shape.bounding_box()
+    return (bb.min.X, bb.min.Y, bb.min.Z, bb.max.X, bb.max.Y, bb.max.Z)
+
+
+class FaceIndex(object):
+    def __init__(self, shape: Shape):
+        self.faces = shape.faces()
+        self._boxes = None
+        self._along = {}
+
+    @property
+    def boxes(self) -> np.ndarray:
+        """(N, 6) min and max corners of the face bounding boxes"""
+        if self._boxes is None:
+            boxes = [_box(f) for f in self.faces]
+            self._boxes = np.array(boxes).reshape(-1, 6)
+        return self._boxes
+
+    def along(self, axis: Axis) -> ShapeList[Face]:
+        """Faces normal to axis sorted along it, like
+        faces().filter_by(axis).sort_by(axis)"""
+        key = (axis.position.to_tuple(), axis.direction.to_tuple())
+        if key not in self._along:
+            self._along[key] = self.faces.filter_by(axis).sort_by(axis)
+        return self._along[key]
+
+    def nearest(self, other: Shape) -> Face:
+        """Face nearest to other, the first in face order of equally near
+        ones, like min(faces(), key=lambda f: f.distance(other))"""
+        other_box = np.array(_box(other))
+        gaps = np.maximum(0, np.maximum(self.boxes[:, :3] - other_box[3:],
+                                        other_box[:3] - self.boxes[:, 3:]))
+        bounds = np.linalg.norm(gaps, axis=1)
+        best, best_i = None, None
+        for i in np.argsort(bounds, kind="stable"):
+            if best is not None and bounds[i] > best:
+                break
+            distance = self.faces[i].distance(other)
+            if best is None or distance < best or \
+                    (distance == best and i < best_i):
+                best, best_i = distance, i
+        return self.faces[best_i]
+
+
+def face_index(shape: Shape) -> FaceIndex:
+    """FaceIndex of shape, cached until shape is moved or its geometry is
+    replaced"""
+    entry = _indexes.get(id(shape))
+    if entry is not None and entry[0].IsEqual(shape.wrapped):
+        return entry[1]
+    if entry is None:
+        weakref.finalize(shape, _indexes.pop, id(shape), None)
+    index = FaceIndex(shape)
+    _indexes[id(shape)] = (shape.wrapped.Located(shape.wrapped.Location()),
+                           index)
+    return index
+
+
+def _local_corners(unlocated, optimal: bool) -> np.ndarray:
+    bnd = Bnd_Box()
+    if optimal:
+        BRepBndLib.AddOptimal_s(unlocated, bnd, True, False)
+    else:
+        BRepBndLib.Add_s(unlocated, bnd, True)
+    x0, y0, z0, x1, y1, z1 = bnd.Get()
+    return np.array([(x, y, z) for x in (x0, x1) for y in (y0, y1)
+                     for z in (z0, z1)])
+
+
+def _geometry_key(unlocated) -> int:
+    # HashCode was replaced by __hash__ in OCCT 7.8
+    if hasattr(unlocated, "HashCode"):
+        return unlocated.HashCode(2**31 - 1)
+    return hash(unlocated)
+
+
+def _matrix(trsf) -> np.ndarray:
+    """(3, 4) rotation and translation of trsf"""
+    return np.array([[trsf.Value(r, c) for c in (1, 2, 3, 4)]
+                     for r in (1, 2, 3)])
+
+
+def _axis_aligned(m: np.ndarray) -> bool:
+    """Whether matrix m only maps axes onto axes, and keeps boxes tight"""
+    r = m[:, :3]
+    return bool(np.all(np.isclose(r, 0) | np.isclose(np.abs(r), 1)))
+
+
+def _cached_corners(unlocated, optimal: bool) -> np.ndarray:
+    key = (_geometry_key(unlocated), optimal)
+    entry = _bboxes.get(key)
+    if entry is None or not entry[0].IsPartner(unlocated):
+        entry = (unlocated, _local_corners(unlocated, optimal))
+        _bboxes[key] = entry
+        if len(_bboxes) > BBOX_CACHE_SIZE:
+            _bboxes.popitem(last=False)
+    else:
+        _bboxes.move_to_end(key)
+    return entry[1]
+
+
+def shape_bbox(shape: Shape, location: Optional[Location] = None,
+               optimal: bool = True) -> BoundBox:
+    """Bounding box of shape, or of shape placed at location instead of
+    its own location, as by located(), without copying it. optimal=False
+    gives faster, looser boxes, see Shape.bounding_box.
+    Boxes are cached per geometry and reused for any location that maps
+    axes onto axes, others are measured directly"""
+    wrapped = shape.wrapped
+    loc = wrapped.Location() if location is None else location.wrapped
+    m = _matrix(loc.Transformation())
+    if not _axis_aligned(m):
+        corners = _local_corners(wrapped.Located(loc), optimal)
+    else:
+        corners = _cached_corners(wrapped.Located(TopLoc_Location()),
+                                  optimal)
+        corners = corners @ m[:, :3].T + m[:, 3]
+    bnd = Bnd_Box()
+    bnd.Update(*corners.min(axis=0), *corners.max(axis=0))
+    return BoundBox(bnd)
+
+
+def shape_bounds(shapes: Iterable[Shape], optimal: bool = True) -> np.ndarray:
+    """(N, 3, 2) min and max X, Y and Z of the bounding boxes of shapes,
+    like shape_bbox, transforming the cached boxes of all of them at
+    once"""
+    shapes = list(shapes)
+    bounds = np.empty((len(shapes), 3, 2))
+    aligned, corners, matrices = [], [], []
+    for i, shape in enumerate(shapes):
+        wrapped = shape.wrapped
+        m = _matrix(wrapped.Location().Transformation())
+        if _axis_aligned(m):
+            aligned.append(i)
+            corners.append(_cached_corners(
+                wrapped.Located(TopLoc_Location()), optimal))
+            matrices.append(m)
+        else:
+            c = _local_corners(wrapped, optimal)
+            bounds[i] = np.stack((c.min(axis=0), c.max(axis=0)), axis=1)
+    if aligned:
+        m = np.array(matrices)
+        c = np.einsum("nkj,nij->nki", np.array(corners), m[:, :, :3]) + \
+            m[:, None, :, 3]
+        bounds[aligned, :, 0] = c.min(axis=1)
+        bounds[aligned, :, 1] = c.max(axis=1)
+    return bounds
@@ -1,13 +1,16 @@
 from build123d import *
 from dataclasses import dataclass, fields
-from typing import Union, List, Tuple, Self, Optional, Iterable
+from typing import Union, List, Tuple, Self, Optional, Iterable, Callable
 from copy import deepcopy, copy
 from bd_common import (
-    CommonPart, connect_to, anchor_to, bound_loc,
+    CommonPart, connect_to, anchor, anchor_to, bound_loc,
+    shape_bbox, auto_unify,
     StraightEdgeJoint, StraightFingerJoint,
     BACK, FRONT, LEFT, RIGHT, TOP, DOWN, CENTER
 )
+from bd_index import face_index
 from enum import Enum
+import bd_trace
 
 # from ocp_vscode import show_object, set_port
 # set_port(3939)
@@ -27,17 +30,41 @@ class LCJointConfig(object):
     spread: Optional[float] = None
 
 
+def _section_xy(part: Part) -> Optional[Sketch]:
+    """Section of part by the XY plane, None if empty"""
+    bb = part.bounding_box()
+    c = bb.center()
+    plane_face = Face.make_rect(bb.size.X + 1, bb.size.Y + 1,
+                                Plane(origin=(c.X, c.Y, 0)))
+    faces = part.intersect(plane_face).faces()
+    if not faces:
+        return None
+    return Sketch(Compound(faces).wrapped)
+
+
 @dataclass
 class LCBoard(CommonPart):
+    """A laser-cut board, made by extruding board_sk by thickness, centered.
+    With native_2d set, joints are not applied as 3D booleans, but recorded
+    as 2D operations on the board profile. The 3D board geometry is then
+    only made when requested by materialize"""
     board_sk: Sketch
     thickness: float
     auto_width_tolerance: float = 0
     auto_thickness_tolerance: float = 0
+    native_2d: bool = False
 
     def make(self):
         self.board_parent = None
         self.board_children = []
         main = extrude(self.board_sk, self.thickness)
+        # Unjoined profile on the mid plane of the centered board
+        c = main.bounding_box().center()
+        self.unjoined_sk = Pos(-c.X, -c.Y) * self.board_sk
+        # List of (Mode, Sketch) 2D joint operations on the profile
+        self.board_ops = []
+        # Location of the profile plane in the LCS
+        self.profile_location = Location()
         main = BasePartObject(main, align=Align.CENTER)
         main.relocate(Pos())
         self.unjoined_board = main
@@ -45,16 +72,73 @@ class LCBoard(CommonPart):
 
     def wrap(self, wrapped: Part):
         new = super().wrap(wrapped)
-        new.board_parent = self.board_parent
-        new.board_children = self.board_children
-        new.unjoined_board = self.unjoined_board
-        new.label = self.label
+        # Extended by later joins, other attributes are shared
+        new.board_children = list(self.board_children)
+        new.board_ops = list(self.board_ops)
         return new
 
     @property
     def unjoined_board_synced(self):
         return self.unjoined_board.located(self.location)
 
+    @property
+    def profile(self) -> Sketch:
+        """2D profile of the board with all 2D joint operations applied,
+        on the XY plane of the profile location"""
+        sk = self.unjoined_sk
+        for mode, op_sk in self.board_ops:
+            sk = sk + op_sk if mode == Mode.ADD else sk - op_sk
+        return sk
+
+    def laid_profile(self) -> Optional[Sketch]:
+        """Centered profile for cutting, None if not native_2d"""
+        if not self.native_2d:
+            return None
+        return anchor(self.profile, CENTER)
+
+    def materialize(self) -> Self:
+        """Returns a copy with 3D geometry made from the profile, or self
+        if there are no 2D joint operations"""
+        if not self.board_ops:
+            return self
+        main = self.profile_location * \
+            extrude(self.profile, self.thickness/2, both=True)
+        main.relocate(Location())
+        new = self.wrap(main)
+        new.locate(self.location)
+        new.color = self.color
+        return new
+
+    def _apply_join_tools(self, located: Self, tools: List[Tuple[Mode, Part]]):
+        """Apply (mode, tool) pairs of a joint to located, a located copy of
+        self, returns the wrapped result"""
+        if not self.native_2d:
+            part = located
+            for mode, tool in tools:
+                part = part + tool if mode == Mode.ADD else part - tool
+            return self.wrap(auto_unify(part))
+        new = self.wrap(located)
+        to_profile = (located.location * self.profile_location).inverse()
+        for mode, tool in tools:
+            op_sk = _section_xy(to_profile * tool)
+            if op_sk is not None:
+                new.board_ops.append((mode, op_sk))
+        return new
+
+    def _join(self, joint: StraightEdgeJoint, male: Self, female: Self,
+              other: Self, plane: Plane, *args):
+        """Join male and female, located copies of self and other, with
+        joint. Returns wrapped (male, female)"""
+        if not (self.native_2d or other.native_2d):
+            m_part, f_part = joint.join(male, female, plane, *args)
+            return self.wrap(m_part), other.wrap(f_part)
+        pos, neg, rec = joint.join_tools(plane, *args)
+        f_tools = [(Mode.SUBTRACT, neg)]
+        if rec is not None:
+            f_tools.append((Mode.ADD, rec))
+        return (self._apply_join_tools(male, [(Mode.ADD, pos)]),
+                other._apply_join_tools(female, f_tools))
+
     def relocate(self, loc: Location, sync: bool = True):
         """Overridden relocate function to sync-relocate unjoined board
         geometry so that connect works correctly.
@@ -64,6 +148,8 @@ class LCBoard(CommonPart):
         if sync:
             self.unjoined_board.locate(self.location)
             self.unjoined_board.relocate(loc)
+            self.profile_location = loc.inverse() * self.location * \
+                self.profile_location
         super().relocate(loc)
 
     def _config_joint(self, other: Self,
@@ -95,42 +181,39 @@ class LCBoard(CommonPart):
         if joint:
             return (joint, joint_count, joint_distance, joint_spread)
 
+    @bd_trace.traced()
     def join_inplace(self, other: Self,
                      joint_config: Union[LCJointConfig, int],
                      connect_by_unjoined_geometry: bool = True):
         # Determine face to join
-        face_to_join = min(((f.distance(other), f)
-                           for f in self.faces()), key=lambda x: x[0])[1]
+        face_to_join = face_index(self).nearest(other)
         face_normal = face_to_join.normal_at(face_to_join.center())
         joint_direction = Axis((0, 0, 0), face_normal.cross(
             self.location.z_axis.direction))
         # Determine auto_length, by orienting the two parts to Z and comparing
         # Z bounding box sizes
         if connect_by_unjoined_geometry:
-            base = self.unjoined_board_synced
-            target = other.unjoined_board_synced
+            base, target = self.unjoined_board, other.unjoined_board
         else:
-            base = copy(self)
-            target = copy(other)
-        base.move(joint_direction.location)
-        target.move(joint_direction.location)
-        auto_length = min(base.bounding_box().size.Z,
-                          target.bounding_box().size.Z)
+            base, target = self, other
+        auto_length = min(
+            shape_bbox(base, joint_direction.location * self.location).size.Z,
+            shape_bbox(target,
+                       joint_direction.location * other.location).size.Z)
 
         joint, joint_count, joint_distance, joint_spread = \
             self._config_joint(other, LCConnect.FROM_BASE,
                                joint_config, auto_length)
 
-        new_base, new_target = joint.join(self, other,
+        new_base, new_target = self._join(joint, self, other, other,
                                           Plane(
                                               face_to_join, x_dir=joint_direction.direction),
                                           joint_count, joint_distance, joint_spread)
-        new_base = self.wrap(new_base)
         new_base.relocate(self.location, sync=False)
-        new_target = other.wrap(new_target)
         new_target.relocate(other.location, sync=False)
         return new_base, new_target
 
+    @bd_trace.traced()
     def connect(self, other: Self, angle: float = 0,
                 offset: Tuple[float, float, float] = (0, 0, 0), flip: bool = False,
                 connect_type: LCConnect = LCConnect.FLOAT,
@@ -166,27 +249,22 @@ class LCBoard(CommonPart):
         to_v += connect_anchor_modifier[1]
         target = connect_to(target, base, from_v, to_v)
         target = Location(offset) * target
-        auto_length = min(base.bounding_box().size.Y,
-                          target.bounding_box().size.Y)
+        auto_length = min(shape_bbox(base).size.Y, shape_bbox(target).size.Y)
         joint, joint_count, joint_distance, joint_spread = \
             self._config_joint(other, connect_type, joint_config, auto_length)
         base_to_join = self.located(base.location)
         target_to_join = other.located(target.location)
         if joint:
             if connect_type == LCConnect.FROM_BASE:
-                base_joined, target_joined = joint.join(base_to_join, target_to_join,
+                base_joined, target_joined = self._join(joint, base_to_join, target_to_join, other,
                                                         Plane(base.faces().sort_by(
                                                             Axis.X).last, x_dir=(0, 1, 0)),
                                                         joint_count, joint_distance, joint_spread)
-                base_joined = self.wrap(base_joined)
-                target_joined = other.wrap(target_joined)
             elif connect_type == LCConnect.TO_BASE:
-                target_joined, base_joined = joint.join(target_to_join, base_to_join,
-                                                        Plane(target.faces().sort_by(
-                                                            Axis.Z).first, x_dir=(0, 1, 0)),
-                                                        joint_count, joint_distance, joint_spread)
-                base_joined = self.wrap(base_joined)
-                target_joined = other.wrap(target_joined)
+                target_joined, base_joined = other._join(joint, target_to_join, base_to_join, self,
+                                                         Plane(target.faces().sort_by(
+                                                             Axis.Z).first, x_dir=(0, 1, 0)),
+                                                         joint_count, joint_distance, joint_spread)
             else:
                 raise ValueError
         if connect_type == LCConnect.FLOAT:
@@ -203,17 +281,40 @@ class LCBoard(CommonPart):
         return base_joined, target_joined
 
 
+@dataclass
+class _LCOp(object):
+    """A recorded LCBuilder operation. Running it calls func(*parts, **params)
+    with the current parts at indices `inputs`, and it returns new parts for
+    indices `outputs`"""
+    func: Callable
+    inputs: Tuple[int, ...]
+    outputs: Tuple[int, ...]
+    params: dict
+    results: Tuple = ()
+
+
 @dataclass
 class LCBuilder(object):
+    """Builder for laser-cut assemblies.
+    All operations done through the builder are recorded, together with the
+    parts they read and write. After changing the inputs of a board with
+    update_board, rebuild only reruns the operations that depend on it,
+    directly or through other changed parts, and reuses all other results"""
     default_thickness: float = 3
     default_joint_config: LCJointConfig = 3
     default_connect_type: LCConnect = LCConnect.FLOAT
     auto_width_tolerance: float = 0
     auto_thickness_tolerance: float = 0
+    # Make boards with native_2d set, see LCBoard
+    native_2d: bool = False
 
     def __post_init__(self):
         self._parts = []
         self._current_board = None
+        self._ops = []
+        # builder_idx -> operation that created the part
+        self._creating_ops = {}
+        self._dirty_ops = set()
 
     @property
     def current_board(self):
@@ -223,57 +324,133 @@ class LCBuilder(object):
     def current_board(self, b):
         self._current_board = b.builder_idx
 
-    def add_board(self, sk: Sketch, thickness: Optional[float] = None, angle: float = 0,
-                  offset: Tuple[float, float, float] = (0, 0, 0), flip: bool = False,
-                  connect_type: Optional[LCConnect] = None,
-                  joint_config: Union[LCJointConfig, int, None] = None,
-                  base_board: Optional[LCBoard] = None, **kwargs):
-        # TODO: comment me
+    def _run_op(self, op: _LCOp):
+        op.results = tuple(op.func(*(self._parts[i] for i in op.inputs),
+                                   **op.params))
+        self._store_op_results(op)
+
+    def _store_op_results(self, op: _LCOp):
+        for idx, part in zip(op.outputs, op.results):
+            part.builder_idx = idx
+            if idx < len(self._parts):
+                # Rerun operations make new parts, keep the label and
+                # color given to the previous one, e.g. by label_objects
+                prev = self._parts[idx]
+                if not part.label:
+                    part.label = prev.label
+                if part.color is None:
+                    part.color = prev.color
+                self._parts[idx] = part
+            else:
+                self._parts.append(part)
+
+    def _record(self, func, inputs, outputs, **params):
+        op = _LCOp(func, tuple(inputs), tuple(outputs), params)
+        self._ops.append(op)
+        self._run_op(op)
+        return op
+
+    def _make_board(self, *base, sk, thickness, angle, offset, flip,
+                    connect_type, joint_config, kwargs):
         if not connect_type:
             connect_type = self.default_connect_type
         if connect_type != LCConnect.FLOAT and joint_config == None:
             joint_config = self.default_joint_config
-        if base_board:
-            self.current_board = base_board
-
         target = LCBoard(
             board_sk=sk,
             thickness=thickness if thickness != None else self.default_thickness,
             auto_width_tolerance=self.auto_width_tolerance,
-            auto_thickness_tolerance=self.auto_thickness_tolerance)
-
-        if not self._parts:
-            target.builder_idx = 0
-            self.current_board = target
-            self._parts.append(target)
-            return target
+            auto_thickness_tolerance=self.auto_thickness_tolerance,
+            native_2d=self.native_2d)
+        if not base:
+            return (target,)
+        return base[0].connect(target,
+                               angle=angle, offset=offset, flip=flip,
+                               connect_type=connect_type, joint_config=joint_config, **kwargs)
 
-        base, target = self.current_board.connect(target,
-                                                  angle=angle, offset=offset, flip=flip,
-                                                  connect_type=connect_type, joint_config=joint_config, **kwargs)
-        self.replace_part(self.current_board, base)
+    def add_board(self, sk: Sketch, thickness: Optional[float] = None, angle: float = 0,
+                  offset: Tuple[float, float, float] = (0, 0, 0), flip: bool = False,
+                  connect_type: Optional[LCConnect] = None,
+                  joint_config: Union[LCJointConfig, int, None] = None,
+                  base_board: Optional[LCBoard] = None, **kwargs):
+        """Add a board, connected to base_board or the current board.
+        The new board becomes the current board"""
+        if base_board:
+            self.current_board = base_board
 
-        target.builder_idx = len(self._parts)
+        idx = len(self._parts)
+        base = (self._current_board,) if self._parts else ()
+        op = self._record(self._make_board, base, base + (idx,),
+                          sk=sk, thickness=thickness, angle=angle,
+                          offset=offset, flip=flip, connect_type=connect_type,
+                          joint_config=joint_config, kwargs=kwargs)
+        self._creating_ops[idx] = op
+        target = self._parts[idx]
         self.current_board = target
-        self._parts.append(target)
         return target
 
-    def add_part(self, target: Part):
-        """Add a non-board part"""
-        if not self._parts:
-            target.builder_idx = 0
-            self._parts.append(target)
-            return
-        target.builder_idx = len(self._parts)
-        self._parts.append(target)
+    def join_inplace(self, board: LCBoard, other: LCBoard,
+                     joint_config: Union[LCJointConfig, int], **kwargs):
+        """Join two already placed boards, see LCBoard.join_inplace.
+        Returns the joined boards"""
+        op = self._record(
+            lambda b, o, **params: b.join_inplace(o, **params),
+            (board.builder_idx, other.builder_idx),
+            (board.builder_idx, other.builder_idx),
+            joint_config=joint_config, **kwargs)
+        return op.results
+
+    def add_part(self, target: Union[Part, Callable[..., Part]],
+                 depends_on: Iterable[Part] = ()):
+        """Add a non-board part.
+        target can also be a function making the part from the parts in
+        depends_on, so that it is remade when any of them changes"""
+        idx = len(self._parts)
+        if callable(target):
+            func = lambda *deps: (target(*deps),)
+        else:
+            func = lambda *deps: (target,)
+        op = self._record(func, (p.builder_idx for p in depends_on), (idx,))
+        self._creating_ops[idx] = op
+        return self._parts[idx]
 
     def replace_part(self, ref: Part, new: Part):
+        """Replace a part by index. This is not recorded, so rebuild will
+        discard the replacement, use join_inplace instead for joins"""
         idx = ref.builder_idx
         new.builder_idx = idx
         self._parts[idx] = new
 
+    def update_board(self, board: LCBoard, **changes):
+        """Change arguments given to add_board when board was added, e.g.
+        sk or thickness. Dependent parts are remade by the next rebuild"""
+        op = self._creating_ops[board.builder_idx]
+        if op.func != self._make_board:
+            raise ValueError("Part was not added by add_board")
+        params = set(op.params) - {"kwargs"}
+        for k, v in changes.items():
+            if k in params:
+                op.params[k] = v
+            else:
+                op.params["kwargs"][k] = v
+        self._dirty_ops.add(id(op))
+
+    def rebuild(self):
+        """Rerun dirty operations and everything depending on them"""
+        if not self._dirty_ops:
+            return
+        dirty_parts = set()
+        for op in self._ops:
+            if id(op) in self._dirty_ops or dirty_parts.intersection(op.inputs):
+                self._run_op(op)
+                dirty_parts.update(op.outputs)
+            else:
+                self._store_op_results(op)
+        self._dirty_ops.clear()
+
     def label_objects(self, names: Iterable[str], scope: dict):
         """Label objects by matching builder_idx"""
+        self.rebuild()
         objs = []
         for n in names:
             idx = scope[n].builder_idx
@@ -282,8 +459,16 @@ class LCBuilder(object):
             objs.append(obj)
         return objs
 
-    def make_assembly(self, **kwargs):
-        return Compound(children=self._parts, **kwargs)
+    def make_assembly(self, materialize: bool = True, **kwargs):
+        """Make assembly of all parts. When materialize is False, native_2d
+        boards are not made into 3D geometry, which is only suitable for
+        exporting their profiles, e.g. by export_assembled_projected_svg"""
+        self.rebuild()
+        parts = self._parts
+        if materialize:
+            parts = [p.materialize() if isinstance(p, LCBoard) else p
+                     for p in parts]
+        return Compound(children=parts, **kwargs)
 
 
 def test():
@@ -0,0 +1,247 @@
+"""Nesting of laid-flat boards onto stock sheets.
+
+Boards are rasterized on a grid of resolution mm, grown by half the
+spacing so that boards placed on disjoint cells are at least spacing
+apart. Boards are placed largest first at the lowest free position of
+the first sheet they fit on, trying every allowed rotation. Placement is
+polygon-aware: boards may be placed into concave parts and holes of
+others, found by FFT correlation of the board with the sheet occupancy.
+Boards that nearly fill their bounding box skip that and are placed by
+free bounding box windows, found with an integral image."""
+from build123d import *
+from bd_common import place, save_layers, section_boards
+from bd_pattern import boundary_segments
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+import numpy as np
+import math
+
+# Boards filling more than this of their bounding box are placed by
+# bounding box only
+BOX_FILL_RATIO = 0.9
+
+
+@dataclass
+class Sheet:
+    """Stock sheet of width x height mm with the boards placed on it, in
+    sheet coordinates starting from (0, 0)"""
+    width: float
+    height: float
+    boards: List[Sketch] = field(default_factory=list)
+    occupancy: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+def _rasterize(board, resolution: float, spacing: float):
+    """Occupancy mask of board grown by spacing / 2, indexed [y, x],
+    and the XY coordinates of its lower left corner"""
+    segments = boundary_segments(board, resolution)
+    # One more cell covers boundary points between cell centers
+    grow = math.ceil(spacing / 2 / resolution) + 1
+    bb = board.bounding_box()
+    origin = np.array((bb.min.X, bb.min.Y)) - grow * resolution
+    nx = math.ceil(bb.size.X / resolution) + 2 * grow + 1
+    ny = math.ceil(bb.size.Y / resolution) + 2 * grow + 1
+    mask = np.zeros((ny, nx + 1), dtype=np.int32)
+    # Even-odd scanline fill at cell centers
+    a, b = segments[:, 0] - origin, segments[:, 1] - origin
+    y = (np.arange(ny) + 0.5)[:, None] * resolution
+    crosses = (a[:, 1] > y) != (b[:, 1] > y)
+    rows, cols = np.nonzero(crosses)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = a[cols, 0] + (y[rows, 0] - a[cols, 1]) * \
+            (b[cols, 0] - a[cols, 0]) / (b[cols, 1] - a[cols, 1])
+    first = np.clip(np.ceil(x / resolution - 0.5), 0, nx).astype(int)
+    np.add.at(mask, (rows, first), 1)
+    mask = np.cumsum(mask, axis=1)[:, :nx] % 2 == 1
+    # Cells touched by the boundary
+    lengths = np.linalg.norm(b - a, axis=1)
+    counts = np.ceil(lengths / (resolution / 2)).astype(int) + 1
+    t = np.concatenate([np.linspace(0, 1, c) for c in counts])
+    starts = np.repeat(a, counts, axis=0)
+    points = starts + t[:, None] * np.repeat(b - a, counts, axis=0)
+    cells = np.clip(np.floor(points / resolution).astype(int), 0,
+                    (nx - 1, ny - 1))
+    mask[cells[:, 1], cells[:, 0]] = True
+    # Grow by a disk of grow cells
+    grown = np.zeros_like(mask)
+    padded = np.pad(mask, grow)
+    for dy in range(-grow, grow + 1):
+        for dx in range(-grow, grow + 1):
+            if dx * dx + dy * dy <= grow * grow:
+                grown |= padded[grow + dy:grow + dy + ny,
+                                grow + dx:grow + dx + nx]
+    return grown, origin
+
+
+def _rotated_origin(origin, shape, resolution: float, angle: float):
+    """Lower left corner of the mask rectangle rotated by angle about the
+    board origin"""
+    ny, nx = shape
+    corners = origin + np.array(
+        [(0, 0), (nx, 0), (0, ny), (nx, ny)]) * resolution
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    rotated = corners @ np.array([[c, s], [-s, c]])
+    return rotated.min(axis=0)
+
+
+def _integral(occupancy: np.ndarray) -> np.ndarray:
+    """Integral image of the occupancy, padded by a row and a column of
+    zeros"""
+    return np.pad(np.cumsum(np.cumsum(occupancy, axis=0), axis=1),
+                  ((1, 0), (1, 0)))
+
+
+def _window_counts(integral: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Number of occupied cells in each h x w window, by lower left cell"""
+    s = integral
+    return s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+
+
+def _box_free(integral: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Whether each h x w window, by lower left cell, is free, from the
+    integral image of the occupancy"""
+    return _window_counts(integral, h, w) == 0
+
+
+def _may_fit(integral: np.ndarray, masks: list, box_only: bool) -> bool:
+    """Whether any of the rotated masks may fit, i.e. there is a window of
+    its size with no more occupied cells than the mask leaves empty, none
+    if box_only. Needs no transforms, unlike _best_position for masks
+    that are not box_only"""
+    H, W = integral.shape[0] - 1, integral.shape[1] - 1
+    for mask in masks:
+        h, w = mask.shape
+        if h > H or w > W:
+            continue
+        empty = 0 if box_only else mask.size - int(mask.sum())
+        if (_window_counts(integral, h, w) <= empty).any():
+            return True
+    return False
+
+
+def _mask_free(occupancy_fft: np.ndarray, shape: tuple, mask: np.ndarray,
+               mask_fft: np.ndarray) -> np.ndarray:
+    """Whether mask, placed by lower left cell, overlaps no occupied
+    cell, for every position it fits"""
+    H, W = shape
+    h, w = mask.shape
+    overlap = np.fft.irfft2(occupancy_fft * np.conj(mask_fft), s=(H, W))
+    return overlap[:H - h + 1, :W - w + 1] < 0.5
+
+
+def _best_position(sheet: Sheet, masks: list, box_only: bool,
+                   mask_ffts: dict, integral: np.ndarray):
+    """(top, x, y, rotation index) of the lowest free position of any
+    rotated mask on sheet, or None. mask_ffts caches the transforms of
+    masks by rotation index across sheets, integral is the _integral of
+    the sheet occupancy"""
+    occupancy = sheet.occupancy
+    H, W = occupancy.shape
+    if not box_only:
+        occupancy_fft = np.fft.rfft2(occupancy.astype(float))
+    best = None
+    tried = set()
+    for k, mask in enumerate(masks):
+        h, w = mask.shape
+        # Bounding boxes only differ by their shape
+        if h > H or w > W or (box_only and mask.shape in tried):
+            continue
+        tried.add(mask.shape)
+        if box_only:
+            free = _box_free(integral, h, w)
+        else:
+            if k not in mask_ffts:
+                mask_ffts[k] = np.fft.rfft2(mask.astype(float), s=(H, W))
+            free = _mask_free(occupancy_fft, occupancy.shape, mask,
+                              mask_ffts[k])
+        rows = free.any(axis=1)
+        if not rows.any():
+            continue
+        # Lowest top edge, then leftmost
+        y = int(np.argmax(rows))
+        x = int(np.argmax(free[y]))
+        position = (y + h, x, y, k)
+        if best is None or position[:2] < best[:2]:
+            best = position
+    return best
+
+
+def nest_boards(boards: Iterable[Sketch], sheet_width: float,
+                sheet_height: float, spacing: float = 3,
+                resolution: float = 1,
+                rotations: Iterable[int] = (0, 90, 180, 270)) -> List[Sheet]:
+    """Pack laid-flat boards, e.g. from section_boards, onto as few
+    sheet_width x sheet_height sheets as possible, at least spacing apart
+    from each other, including the kerf, and from the sheet edges.
+    Rotations are multiples of 90 degrees.
+    Returns the sheets with boards placed on them, keeping labels"""
+    rotations = list(rotations)
+    if any(r % 90 for r in rotations):
+        raise ValueError("Rotations must be multiples of 90 degrees")
+    grid = (math.floor(sheet_height / resolution),
+            math.floor(sheet_width / resolution))
+    # Half the spacing to the sheet edges, the masks cover the other half
+    edge = math.ceil(spacing / 2 / resolution)
+    items = []
+    for board in boards:
+        mask, origin = _rasterize(board, resolution, spacing)
+        items.append((board, mask, origin))
+    items.sort(key=lambda item: -item[1].sum())
+    sheets: List[Sheet] = []
+    for board, mask, origin in items:
+        masks = [np.rot90(mask, (-r // 90) % 4) for r in rotations]
+        box_only = mask.sum() > BOX_FILL_RATIO * mask.size
+        position = None
+        mask_ffts = {}
+        for sheet in sheets:
+            # Prefilter sheets without a window the board may fit in
+            integral = _integral(sheet.occupancy)
+            if not _may_fit(integral, masks, box_only):
+                continue
+            position = _best_position(sheet, masks, box_only, mask_ffts,
+                                      integral)
+            if position is not None:
+                break
+        if position is None:
+            sheet = Sheet(sheet_width, sheet_height)
+            sheet.occupancy = np.zeros(grid, dtype=bool)
+            if edge:
+                sheet.occupancy[:edge] = sheet.occupancy[-edge:] = True
+                sheet.occupancy[:, :edge] = sheet.occupancy[:, -edge:] = True
+            position = _best_position(sheet, masks, box_only, mask_ffts,
+                                      _integral(sheet.occupancy))
+            if position is None:
+                raise ValueError(
+                    f"Board {board.label} does not fit on a "
+                    f"{sheet_width}x{sheet_height} sheet")
+            sheets.append(sheet)
+        _, x, y, k = position
+        rotated = masks[k]
+        h, w = rotated.shape
+        sheet.occupancy[y:y + h, x:x + w] |= rotated
+        angle = rotations[k]
+        corner = _rotated_origin(origin, mask.shape, resolution, angle)
+        offset = np.array((x, y)) * resolution - corner
+        placed = place(board, Pos(float(offset[0]), float(offset[1]))
+                       * Rot(Z=angle))
+        sheet.boards.append(placed)
+    return sheets
+
+
+def nest_assembly(assembly: Compound, sheet_width: float,
+                  sheet_height: float, jobs: int = 1,
+                  **nest_args) -> List[Sheet]:
+    """Lay flat and nest the child boards of assembly, e.g. made by
+    LCBuilder, sectioning them in up to jobs forked processes, see
+    nest_boards"""
+    return nest_boards(section_boards(assembly.children, jobs),
+                       sheet_width, sheet_height, **nest_args)
+
+
+def save_sheets(sheets: List[Sheet], prefix: str, ext: str = "svg",
+                **save_args) -> list:
+    """Write every sheet to prefix + sheet number + ext, .svg or .dxf,
+    one layer per board label, returns the reports of save_layers"""
+    return [save_layers(sheet.boards, f"{prefix}sheet{i + 1}.{ext}",
+                        **save_args)
+            for i, sheet in enumerate(sheets)]
@@ -0,0 +1,127 @@
+"""Hole patterns for perforations and ventilation grids.
+
+Hole centers are computed as (N, 2) NumPy arrays in local XY coordinates,
+centered on the origin like GridLocations, and can be clipped to a
+boundary sketch. perforate() places one cutter at every center as
+location-only instances and subtracts them in a single boolean, which
+keeps thousands of holes practical."""
+from build123d import *
+from bd_common import cut_tools, instance_compound
+from OCP.gp import gp_Trsf, gp_Vec
+from OCP.TopLoc import TopLoc_Location
+from typing import Optional
+import numpy as np
+import math
+
+
+def grid_centers(x_spacing: float, y_spacing: float,
+                 x_count: int, y_count: int) -> np.ndarray:
+    """Rectangular grid, in the same order as GridLocations"""
+    x = (np.arange(x_count) - (x_count - 1) / 2) * x_spacing
+    y = (np.arange(y_count) - (y_count - 1) / 2) * y_spacing
+    xx, yy = np.meshgrid(x, y, indexing="ij")
+    return np.column_stack((xx.ravel(), yy.ravel()))
+
+
+def staggered_centers(x_spacing: float, y_spacing: float,
+                      x_count: int, y_count: int) -> np.ndarray:
+    """Grid with every other row shifted by half x_spacing"""
+    centers = grid_centers(x_spacing, y_spacing, x_count, y_count)
+    row = np.tile(np.arange(y_count), x_count)
+    centers[:, 0] += np.where(row % 2, x_spacing / 4, -x_spacing / 4)
+    return centers
+
+
+def hex_centers(spacing: float, x_count: int, y_count: int) -> np.ndarray:
+    """Hexagonal packing, every center is spacing away from its
+    neighbours"""
+    return staggered_centers(spacing, spacing * math.sqrt(3) / 2,
+                             x_count, y_count)
+
+
+def boundary_segments(boundary, resolution: float) -> np.ndarray:
+    """(M, 2, 2) array of line segments approximating the outer and inner
+    wires of the faces of boundary, curves split into segments of about
+    resolution mm"""
+    segments = []
+    for face in boundary.faces():
+        for wire in [face.outer_wire()] + face.inner_wires():
+            for edge in wire.edges():
+                if edge.geom_type == GeomType.LINE:
+                    count = 2
+                else:
+                    count = max(3, math.ceil(edge.length / resolution) + 1)
+                points = np.array([(p.X, p.Y) for p in edge.positions(
+                    np.linspace(0, 1, count))])
+                segments.append(np.stack((points[:-1], points[1:]), axis=1))
+    return np.concatenate(segments)
+
+
+def clip_centers(centers: np.ndarray, boundary, radius: float = 0,
+                 margin: float = 0, resolution: float = 0.5,
+                 chunk_size: int = 4096) -> np.ndarray:
+    """Keep centers of holes with radius lying inside boundary, a Sketch
+    or Face on the XY plane, at least margin away from its edges.
+    Curved edges are approximated by segments of about resolution length"""
+    segments = boundary_segments(boundary, resolution)
+    a, b = segments[:, 0], segments[:, 1]
+    ab = b - a
+    ab_len2 = np.maximum((ab ** 2).sum(axis=1), 1e-12)
+    keep = np.zeros(len(centers), dtype=bool)
+    for start in range(0, len(centers), chunk_size):
+        p = centers[start:start + chunk_size, None, :]
+        # Even-odd rule with a ray in +X
+        crosses = (a[:, 1] > p[..., 1]) != (b[:, 1] > p[..., 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = a[:, 0] + (p[..., 1] - a[:, 1]) * ab[:, 0] / ab[:, 1]
+        inside = (crosses & (p[..., 0] < x_cross)).sum(axis=1) % 2 == 1
+        t = np.clip(((p - a) * ab).sum(axis=2) / ab_len2, 0, 1)
+        nearest = a + t[..., None] * ab
+        distance = np.sqrt(((p - nearest) ** 2).sum(axis=2)).min(axis=1)
+        keep[start:start + chunk_size] = inside & (distance >= radius + margin)
+    return centers[keep]
+
+
+def fill_centers(boundary, x_spacing: float, y_spacing: Optional[float] = None,
+                 pattern: str = "hex", radius: float = 0,
+                 margin: float = 0) -> np.ndarray:
+    """Centers of a "rect", "staggered" or "hex" pattern filling boundary,
+    see clip_centers. y_spacing defaults to x_spacing, hex patterns only
+    use x_spacing"""
+    y_spacing = y_spacing or x_spacing
+    if pattern == "hex":
+        y_spacing = x_spacing * math.sqrt(3) / 2
+    bb = boundary.bounding_box()
+    x_count = math.floor(bb.size.X / x_spacing) + 2
+    y_count = math.floor(bb.size.Y / y_spacing) + 2
+    if pattern == "rect":
+        centers = grid_centers(x_spacing, y_spacing, x_count, y_count)
+    elif pattern in ("hex", "staggered"):
+        centers = staggered_centers(x_spacing, y_spacing, x_count, y_count)
+    else:
+        raise ValueError(f"Unknown pattern {pattern}")
+    centers += (bb.center().X, bb.center().Y)
+    return clip_centers(centers, boundary, radius, margin)
+
+
+def pattern_locations(centers: np.ndarray,
+                      plane: Plane = Plane.XY) -> list[Location]:
+    """Locations of centers on plane"""
+    base = plane.location.wrapped
+    locations = []
+    for x, y in centers:
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(float(x), float(y), 0))
+        locations.append(Location(base.Multiplied(TopLoc_Location(trsf))))
+    return locations
+
+
+def hole_pattern(cutter, centers: np.ndarray, plane: Plane = Plane.XY):
+    """Compound of location-only instances of cutter at every center"""
+    return instance_compound(cutter, pattern_locations(centers, plane))
+
+
+def perforate(target, cutter, centers: np.ndarray, plane: Plane = Plane.XY):
+    """Subtract cutter at every center on plane from target, a Part or
+    Sketch, in one batched boolean"""
+    return cut_tools(target, hole_pattern(cutter, centers, plane))
@@ -0,0 +1,92 @@
+"""Timed spans of builds, written in Chrome trace event format.
+
+Tracing is off by default, spans then cost a flag check. Enable it with
+start_trace(), or the --trace option of CommonCLI, and open the written
+file in chrome://tracing or https://ui.perfetto.dev. Spans opened while
+another span is open are nested under it, which follows the part
+hierarchy since parts are made while making their parents.
+
+This module does not import build123d, see cad_cli."""
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager, nullcontext
+from typing import Optional, List, Dict, Any
+
+_enabled = False
+# Chrome trace events recorded since start_trace
+_events: List[Dict[str, Any]] = []
+_null_span = nullcontext()
+
+
+def tracing() -> bool:
+    return _enabled
+
+
+def start_trace():
+    """Start recording spans, dropping previously recorded ones"""
+    global _enabled
+    _events.clear()
+    _enabled = True
+
+
+def stop_trace() -> List[Dict[str, Any]]:
+    """Stop recording spans, returns the recorded events"""
+    global _enabled
+    _enabled = False
+    return list(_events)
+
+
+def add_events(events: List[Dict[str, Any]]):
+    """Add events recorded elsewhere, e.g. by forked workers"""
+    if _enabled:
+        _events.extend(events)
+
+
+def write_trace(fn: str, events: Optional[List[Dict[str, Any]]] = None):
+    """Write events, or the recorded ones, as a Chrome trace file"""
+    with open(fn, "w") as f:
+        json.dump({"traceEvents": _events if events is None else events,
+                   "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def _span(name: str, args: Dict[str, Any]):
+    start = time.perf_counter_ns()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter_ns()
+        _events.append({
+            "name": name, "cat": name.rsplit(".", 1)[-1], "ph": "X",
+            "ts": start / 1000, "dur": (end - start) / 1000,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "args": args,
+        })
+
+
+def span(name: str, **args):
+    """Context manager timing its body as a span named name, extra
+    arguments are shown with the span. It gives the body the dict of
+    arguments to add results to, or None when not tracing"""
+    if not _enabled:
+        return _null_span
+    return _span(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator timing every call as a span, named after the function's
+    qualified name if name is not given"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+"""Helpers for the watch mode of CommonCLI: tracking changes of source
+files and reloading affected modules in a running interpreter"""
+import os, sys
+import importlib
+import inspect
+import runpy
+from typing import List, Dict, Iterable, Set
+
+import bd_cache
+
+
+class SourceWatcher(object):
+    """Polls modification times of all .py files under dirs"""
+
+    def __init__(self, dirs: Iterable[str]):
+        self.dirs = sorted(set(os.path.abspath(d) for d in dirs))
+        self._mtimes = self._scan()
+
+    def _scan(self) -> Dict[str, int]:
+        mtimes = {}
+        for d in self.dirs:
+            for root, _, files in os.walk(d):
+                for fn in files:
+                    if not fn.endswith(".py"):
+                        continue
+                    path = os.path.join(root, fn)
+                    try:
+                        mtimes[path] = os.stat(path).st_mtime_ns
+                    except FileNotFoundError:
+                        pass
+        return mtimes
+
+    def poll(self) -> List[str]:
+        """Returns files changed, added or removed since the last poll"""
+        mtimes = self._scan()
+        changed = [f for f in set(mtimes) | set(self._mtimes)
+                   if mtimes.get(f) != self._mtimes.get(f)]
+        self._mtimes = mtimes
+        return changed
+
+    def _module_file(self, module):
+        fn = getattr(module, "__file__", None)
+        if not fn:
+            return None
+        fn = os.path.abspath(fn)
+        if any(fn.startswith(d + os.sep) for d in self.dirs):
+            return fn
+        return None
+
+    def watched_modules(self) -> Dict[str, object]:
+        """Loaded modules defined by files under the watched dirs"""
+        return dict((name, m) for name, m in list(sys.modules.items())
+                    if self._module_file(m))
+
+    def reload(self, changed_files: Iterable[str]) -> List[str]:
+        """Reload modules defined by changed_files and all watched modules
+        depending on them, returns the names of reloaded modules.
+        __main__ is never reloaded, see reload_class"""
+        changed = set(os.path.abspath(f) for f in changed_files)
+        watched = self.watched_modules()
+        affected = set(name for name, m in watched.items()
+                       if self._module_file(m) in changed)
+        affected = _dependents(affected, watched)
+        reloaded = []
+        for name in _reload_order(affected, watched):
+            if watched[name] is sys.modules["__main__"]:
+                continue
+            importlib.reload(sys.modules[name])
+            reloaded.append(name)
+        if affected:
+            bd_cache.clear_source_digests()
+        return reloaded
+
+
+def _dependents(names: Set[str], modules: Dict[str, object]) -> Set[str]:
+    """Closure of names over modules referencing any of them, directly or
+    through objects defined in them"""
+    affected = set(names)
+    found = True
+    while found:
+        found = False
+        for name, m in modules.items():
+            if name in affected:
+                continue
+            for v in list(vars(m).values()):
+                src = v.__name__ if inspect.ismodule(v) else \
+                    getattr(v, "__module__", None)
+                if src in affected:
+                    affected.add(name)
+                    found = True
+                    break
+    return affected
+
+
+def _reload_order(names: Set[str], modules: Dict[str, object]) -> List[str]:
+    """Modules in import order, with packages after their submodules"""
+    order = list(modules)
+    plain = [n for n in order if n in names and
+             not hasattr(modules[n], "__path__")]
+    packages = sorted((n for n in names if hasattr(modules[n], "__path__")),
+                      key=lambda n: -n.count("."))
+    return plain + packages
+
+
+def reload_class(module_name: str, class_name: str):
+    """Returns the current definition of a class after reloading.
+    Classes defined in __main__ are redefined by running it again under
+    another name"""
+    main = sys.modules["__main__"]
+    if sys.modules[module_name] is not main:
+        return getattr(sys.modules[module_name], class_name)
+    spec = getattr(main, "__spec__", None)
+    if spec is not None:
+        if spec.name in sys.modules:
+            return getattr(sys.modules[spec.name], class_name)
+        namespace = runpy.run_module(spec.name, run_name="__watch__")
+    else:
+        namespace = runpy.run_path(main.__file__, run_name="__watch__")
+    return namespace[class_name]
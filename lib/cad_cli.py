@@ -0,0 +1,686 @@
+"""Command line interface layer for parts and assemblies.
+
+This module does not import build123d, so that argument parsing and --help
+do not pay for loading the geometry kernel, which is only imported when a
+build actually runs. CLIs also cache their argument specs, so that
+fast_help can answer --help for a design file before it imports build123d,
+see fast_help."""
+from dataclasses import fields, _MISSING_TYPE
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from typing import (
+    List, Optional, Type, Callable, Tuple, Dict, Any, Iterable)
+from copy import copy
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import traceback
+import warnings
+import selectors
+import itertools
+import hashlib
+import json
+import csv
+import socket
+import shlex
+import time
+import os, sys
+import bd_trace
+
+
+def get_field_default(f):
+    """Default value of dataclass field f, made by its default_factory if
+    it has one"""
+    if not isinstance(f.default, _MISSING_TYPE):
+        return f.default
+    if not isinstance(f.default_factory, _MISSING_TYPE):
+        return f.default_factory()
+    raise Exception(f"No default and no default_factory for field {f.name}")
+
+def init_dataclass_from(data_class, obj, param_name_remap={}, *args, **kwargs):
+    '''Initialize dataclass from an exiting dataclass object
+    With remaps and overriding arguments as well'''
+    fields_set = set(f.name for f in fields(data_class))
+    param_dict = dict((param_name_remap.get(k, k), getattr(obj, k)) for k in dir(obj)
+                if k in fields_set
+                )
+    param_dict.update(dict((param_name_remap[k], getattr(obj, k)) for k in param_name_remap))
+    param_dict.update(kwargs)
+    return data_class(*args, **param_dict)
+
+class SaveError(Exception):
+    """Raised by run_save_tasks, failures is a list of
+    (task name, formatted traceback) for every failed task"""
+    def __init__(self, failures: List[Tuple[str, str]]):
+        self.failures = failures
+        super().__init__(
+            f"{len(failures)} save task(s) failed:\n" +
+            "\n".join(f"[{name}]\n{tb}" for name, tb in failures))
+
+
+# Function of the running map_forked call, inherited by forked workers
+_forked_func = None
+# Set once native threads may run, e.g. by OCCT parallel booleans
+_native_threads = False
+
+
+def note_native_threads():
+    """Record that native worker threads may have been started, e.g. by
+    OCCT booleans run with SetRunParallel, so that map_forked stops
+    forking. Only needed where threads can not be counted, see
+    _single_threaded"""
+    global _native_threads
+    _native_threads = True
+
+
+def _single_threaded() -> bool:
+    """Whether this process runs a single thread and can be forked
+    safely. Linux counts every OS thread, including OCCT's thread pool"""
+    try:
+        return len(os.listdir("/proc/self/task")) == 1
+    except OSError:
+        return not _native_threads and threading.active_count() == 1
+
+
+def _call_forked(item):
+    # Trace events of workers are returned to the parent to merge
+    if not bd_trace.tracing():
+        return _forked_func(item), []
+    bd_trace.start_trace()
+    result = _forked_func(item)
+    return result, bd_trace.stop_trace()
+
+
+def map_forked(func: Callable, items: Iterable, jobs: int = 1) -> list:
+    """Map func over items in up to jobs forked processes.
+    Shapes are not picklable, so workers get func, and everything it
+    refers to, by inheriting it on fork, spawned processes would not have
+    them. Only items and results are pickled.
+    Forking a process running other threads can deadlock the children on
+    locks those threads held, e.g. OCCT's thread pool once parallel
+    booleans or meshing ran. So this maps in this process, with a
+    warning, once other threads run, and where fork is unavailable"""
+    global _forked_func
+    items = list(items)
+    fork = jobs > 1 and len(items) > 1 and \
+        "fork" in multiprocessing.get_all_start_methods()
+    if fork and not _single_threaded():
+        warnings.warn("Other threads are running, e.g. OCCT's thread pool, "
+                      "running jobs serially instead of forking")
+        fork = False
+    if fork:
+        _forked_func = func
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=min(jobs, len(items)),
+                    mp_context=multiprocessing.get_context("fork")) as pool:
+                results = []
+                for result, events in pool.map(_call_forked, items):
+                    bd_trace.add_events(events)
+                    results.append(result)
+                return results
+        finally:
+            _forked_func = None
+    return [func(item) for item in items]
+
+
+def _run_save_task(task):
+    name, func, args = task
+    try:
+        # Exporters report failures by returning False
+        with bd_trace.span(f"save {name}", func=func.__name__):
+            failed = func(*args) is False
+        if failed:
+            return f"{func.__name__} failed"
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def run_save_tasks(tasks: List[Tuple[str, Callable, tuple]], jobs: int = 1):
+    """Run save tasks given as (name, func, args), in up to jobs forked
+    processes, see map_forked.
+    All tasks are run, then a SaveError is raised for any failures"""
+    errors = map_forked(lambda i: _run_save_task(tasks[i]),
+                        range(len(tasks)), jobs)
+    failures = [(name, err) for (name, _, _), err in zip(tasks, errors) if err]
+    if failures:
+        raise SaveError(failures)
+
+
+class BuildMemo(object):
+    """LRU memo of made objects, bounded by number of entries and
+    optionally by estimated memory use in bytes"""
+    def __init__(self, max_entries: int = 8, max_memory: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        # key -> (object, estimated size)
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, obj):
+        if self.max_entries <= 0:
+            return
+        size = 0
+        if self.max_memory is not None:
+            import bd_cache
+            size = bd_cache.brep_size(obj)
+        self._entries[key] = (obj, size)
+        self._entries.move_to_end(key)
+        # Evict least recently used entries, always keeping the newest one
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or
+                (self.max_memory is not None and
+                 self.memory > self.max_memory)):
+            self._entries.popitem(last=False)
+
+    @property
+    def memory(self):
+        return sum(size for _, size in self._entries.values())
+
+    def clear(self):
+        self._entries.clear()
+
+
+class CommonCLI(object):
+    # Name of the parsed argument holding the output name
+    _output_dest = "output"
+
+    def __init__(self,
+                 obj_class: Type,
+                 extra_arg_config: dict = {},
+                 parser: ArgumentParser = ArgumentParser(
+                     formatter_class=ArgumentDefaultsHelpFormatter,
+                     conflict_handler='resolve'),
+                 args: List[Any] = [],
+                 override_conflict_args: bool = False,
+                 memo_size: int = 8,
+                 memo_memory: Optional[int] = None,
+                 ):
+        self._obj = None
+        self._obj_class = obj_class
+        self._memo = BuildMemo(memo_size, memo_memory)
+        # Module running the CLI, given to main, looked up again when
+        # reloading in watch mode
+        self._module_name = "__main__"
+        self._base_parser = parser
+        self._built_parser = None
+        self._extra_arg_config = extra_arg_config
+        self._unparsed_args = args
+
+    @property
+    def _parser(self) -> ArgumentParser:
+        """Argument parser, only constructed when first used"""
+        if self._built_parser is None:
+            self._built_parser = self._base_parser
+            self.add_field_arguments()
+            self.add_output_argument()
+            self.add_watch_arguments()
+            self.add_sweep_arguments()
+            self.add_trace_arguments()
+        return self._built_parser
+
+    def add_field_arguments(self):
+        extra_arg_config = self._extra_arg_config
+
+        def get_aliases(name): return extra_arg_config.get(
+            name, {}).get("aliases", [])
+
+        def get_extra(name): return {
+            k: extra_arg_config[k] for k in extra_arg_config.get(name, {}) if k != "aliases"}
+
+        for f in fields(self._obj_class):
+            if f.metadata.get("no_CLI"):
+                continue
+            aliases = get_aliases(f.name)
+            extra = copy(get_extra(f.name))
+            if isinstance(f.default, _MISSING_TYPE) and \
+                isinstance(f.default_factory, _MISSING_TYPE):
+                self._parser.add_argument(f.name, type=f.type, *aliases, **extra)
+            else:
+                if not "default" in extra:
+                    extra["default"] = get_field_default(f)
+                if not "help" in extra:
+                    extra["help"] = f.name
+                self._parser.add_argument(f"--{f.name}", type=f.type, *aliases, **extra)
+
+    def add_output_argument(self):
+        self._parser.add_argument(
+            "-o", "--output", help="Output file to write to, if omitted, output will be disabled")
+
+    def add_watch_arguments(self):
+        self._parser.add_argument(
+            "-w", "--watch", default=False, action="store_true",
+            help="Keep running and remake output whenever sources under lib/ "
+            "or next to the design file change. Lines of new arguments "
+            "are read from stdin and merged over the current ones, an empty "
+            "line remakes with the current ones")
+        self._parser.add_argument(
+            "--watch_port", type=int, default=None,
+            help="In watch mode, also read lines of new arguments from "
+            "connections to this localhost TCP port")
+
+    def add_trace_arguments(self):
+        self._parser.add_argument(
+            "--trace",
+            help="Write timings of build steps to this file in Chrome trace "
+            "event format, for chrome://tracing or ui.perfetto.dev")
+
+    def add_sweep_arguments(self):
+        self._parser.add_argument(
+            "-j", "--jobs", type=int, default=1,
+            help="Number of processes to use for saving outputs and sweeps")
+        self._parser.add_argument(
+            "--sweep",
+            help="JSON or CSV file of field values to make and save every "
+            "variant of. JSON can be a list of {field: value} objects or a "
+            "{field: [values]} object to sweep all combinations of. "
+            "Output names are formatted with the field values and {index}, "
+            "e.g. 'out/clip_{snap_tolerance}.stl'")
+        self._parser.add_argument(
+            "--sweep_manifest",
+            help="Path of the JSON manifest of sweep outputs and timings, "
+            "defaults to sweep_manifest.json next to the first output")
+
+    def parse_args(self, extra_args: Optional[List[Any]] = None):
+        _args = self._parser.parse_args(self._unparsed_args + extra_args)
+        return _args
+    
+    def _get_init_args(self):
+        init_args = {f.name: getattr(self._args, (f.name)) for f in fields(
+            self._obj_class) if f.name in self._args}
+        init_non_args = {f.name: get_field_default(f) for f in fields(
+            self._obj_class) if not f.name in self._args}
+        init_args.update(init_non_args)
+        return init_args
+
+    def make(self):
+        if self._obj is None:
+            self._obj = self._obj_class(**self._get_init_args())
+        return self._obj
+    
+    def _memo_key(self):
+        """Key of the object to make with current arguments, arguments not
+        used for making it, e.g. output options, are left out, registered
+        settings are included. None if any of them can not be keyed, see
+        bd_cache.params_key"""
+        import bd_cache
+        params = bd_cache.params_key(dict(self._get_init_args(),
+                                          __globals__=bd_cache.settings()))
+        if params is None:
+            return None
+        return (self._obj_class, params)
+
+    def remake_with_args(self, args):
+        """Make object with args, reusing recently made objects with the
+        same arguments"""
+        self._args = self.parse_args(args)
+        key = self._memo_key()
+        obj = None if key is None else self._memo.get(key)
+        if obj is None:
+            self.clear_cached()
+            obj = self.make()
+            if key is not None:
+                self._memo.put(key, obj)
+        self._obj = obj
+        return obj
+
+    # Clear cached object to force remake
+    def clear_cached(self):
+        self._obj = None
+
+    def save_output(self):
+        raise NotImplemented
+
+    @property
+    def output_is_set(self):
+        return not self._args.output is None
+
+    def main(self, module_name: str = "__main__"):
+        """Run the CLI, module_name is the __name__ of the module defining
+        the object class, for caching argument specs and watch mode"""
+        self._module_name = module_name
+        self.clear_cached()
+
+        self.save_spec()
+        self._args = self.parse_args(sys.argv[1:])
+        if self._args.trace:
+            bd_trace.start_trace()
+        try:
+            if self._args.watch:
+                self.watch()
+            elif self._args.sweep:
+                self.sweep()
+            elif self.output_is_set:
+                self.save_output()
+            elif self._args.trace:
+                self.make()
+        finally:
+            if self._args.trace:
+                bd_trace.write_trace(self._args.trace, bd_trace.stop_trace())
+
+    def save_spec(self):
+        """Cache the argument spec of a CLI run as a script, for fast_help"""
+        module = sys.modules[self._module_name]
+        module_file = getattr(module, "__file__", None)
+        if self._module_name != "__main__" or not module_file:
+            return
+        spec = {
+            "digest": _spec_digest(module_file),
+            "args": [str(a) for a in self._unparsed_args],
+            "spec": [_action_spec(a) for a in self._parser._actions],
+        }
+        try:
+            os.makedirs(os.path.dirname(_spec_path(module_file)), exist_ok=True)
+            with open(_spec_path(module_file), "w") as f:
+                json.dump(spec, f)
+        except OSError:
+            pass
+
+    def _load_sweep(self, fn: str) -> List[Dict[str, Any]]:
+        """Read variants of field values for sweep from a JSON or CSV file"""
+        with open(fn, newline="") as f:
+            if os.path.splitext(fn)[1].lower() == ".csv":
+                variants = list(csv.DictReader(f))
+            else:
+                variants = json.load(f)
+        if isinstance(variants, dict):
+            names = list(variants)
+            variants = [dict(zip(names, values)) for values in
+                        itertools.product(*(variants[n] for n in names))]
+        sweepable = set(f.name for f in fields(self._obj_class)
+                        if not f.metadata.get("no_CLI") and
+                        not (isinstance(f.default, _MISSING_TYPE) and
+                             isinstance(f.default_factory, _MISSING_TYPE)))
+        for v in variants:
+            unknown = set(v) - sweepable
+            if unknown:
+                raise ValueError(f"Can not sweep over {sorted(unknown)}")
+        return variants
+
+    def _run_variant(self, args) -> Dict[str, Any]:
+        self._args = args
+        start = time.perf_counter()
+        try:
+            self.clear_cached()
+            self.make()
+            made = time.perf_counter()
+            self.save_output()
+        except Exception:
+            return {"error": traceback.format_exc()}
+        return {"make_time": made - start,
+                "save_time": time.perf_counter() - made}
+
+    def sweep(self):
+        """Make and save every variant given by --sweep, in up to --jobs
+        forked processes, then write a manifest of outputs and timings"""
+        variants = self._load_sweep(self._args.sweep)
+        template = getattr(self._args, self._output_dest)
+        if template is None:
+            raise ValueError("Sweeps need an output name template")
+        outputs = [template.format(index=i, **v)
+                   for i, v in enumerate(variants)]
+        if len(set(outputs)) != len(outputs):
+            raise ValueError("Output name template does not give unique "
+                             "names, use {index} or field names in it")
+        actions = dict((a.dest, a) for a in self._parser._actions)
+        variant_args = []
+        for v, output in zip(variants, outputs):
+            args = copy(self._args)
+            for k, value in v.items():
+                convert = actions[k].type
+                setattr(args, k, convert(value) if convert else value)
+            setattr(args, self._output_dest, output)
+            # Variants are already run in parallel
+            args.jobs = 1
+            variant_args.append(args)
+        start = time.perf_counter()
+        results = map_forked(lambda i: self._run_variant(variant_args[i]),
+                             range(len(variants)), self._args.jobs)
+        manifest = {
+            "total_time": time.perf_counter() - start,
+            "variants": [dict(index=i, params=v, output=o, **r) for i, (v, o, r)
+                         in enumerate(zip(variants, outputs, results))]
+        }
+        manifest_fn = self._args.sweep_manifest or os.path.join(
+            os.path.dirname(outputs[0]), "sweep_manifest.json")
+        with open(manifest_fn, "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        failures = [(f"variant {i}", r["error"])
+                    for i, r in enumerate(results) if "error" in r]
+        print(f"Swept {len(variants)} variants in "
+              f"{manifest['total_time']:.3f}s, {len(failures)} failed, "
+              f"manifest written to {manifest_fn}", file=sys.stderr)
+        if failures:
+            raise SaveError(failures)
+
+    def _watch_run(self, line: Optional[str] = None) -> str:
+        """Remake and save output, with a new line of arguments if given,
+        which are merged over the current ones. Returns a status message"""
+        start = time.perf_counter()
+        try:
+            if line is not None:
+                # Defaults are only set for arguments missing from the
+                # namespace, so the current ones are kept
+                self._args = self._parser.parse_args(
+                    shlex.split(line), namespace=copy(self._args))
+            self.clear_cached()
+            self.make()
+            if self.output_is_set:
+                self.save_output()
+        except SystemExit:
+            # Argument errors, already reported by the parser
+            return "Failed"
+        except Exception:
+            return traceback.format_exc() + "Failed"
+        return f"Done in {time.perf_counter() - start:.3f}s"
+
+    def watch(self):
+        """Watch mode, keeping imported libraries and unchanged modules
+        loaded between builds, see add_watch_arguments"""
+        import bd_watch
+        dirs = [os.path.dirname(os.path.abspath(__file__))]
+        main_file = getattr(sys.modules[self._module_name], "__file__", None)
+        if main_file:
+            dirs.append(os.path.dirname(os.path.abspath(main_file)))
+        watcher = bd_watch.SourceWatcher(dirs)
+        sel = selectors.DefaultSelector()
+        sel.register(sys.stdin.fileno(), selectors.EVENT_READ)
+        server = None
+        if self._args.watch_port:
+            server = socket.create_server(("127.0.0.1", self._args.watch_port))
+            sel.register(server, selectors.EVENT_READ)
+        stdin_buf = b""
+        print(self._watch_run(), file=sys.stderr)
+        try:
+            while True:
+                lines = []
+                events = sel.select(timeout=0.5) if sel.get_map() else \
+                    time.sleep(0.5) or []
+                for key, _ in events:
+                    if key.fileobj is server:
+                        conn, _ = server.accept()
+                        with conn, conn.makefile("rw") as f:
+                            f.write(self._watch_run(f.readline()) + "\n")
+                        continue
+                    data = os.read(key.fd, 65536)
+                    *new_lines, stdin_buf = (stdin_buf + data).split(b"\n")
+                    if not data:
+                        sel.unregister(key.fd)
+                        # The last line may end at EOF without a newline
+                        if stdin_buf:
+                            new_lines.append(stdin_buf)
+                            stdin_buf = b""
+                    lines += [l.decode() for l in new_lines]
+                for line in lines:
+                    print(self._watch_run(line), file=sys.stderr)
+                changed = watcher.poll()
+                if changed:
+                    try:
+                        watcher.reload(changed)
+                        self._obj_class = bd_watch.reload_class(
+                            self._module_name, self._obj_class.__name__)
+                    except Exception:
+                        traceback.print_exc()
+                        continue
+                    print(self._watch_run(), file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.close()
+    
+class CommonPartCLI(CommonCLI):
+    def save_output(self):
+        from build123d import exporters3d
+        ext = os.path.splitext(self._args.output)[1][1:]
+        if not hasattr(exporters3d, f"export_{ext}"):
+            raise ValueError("Unknown output file type")
+        export_func = getattr(exporters3d, f"export_{ext}")
+        obj = self.make()
+        with bd_trace.span(f"save {self._args.output}", func=export_func.__name__):
+            export_func(obj, self._args.output)
+
+class CommonAssemblyCLI(CommonCLI):
+    _output_dest = "output_prefix"
+
+    def add_output_argument(self):
+        self._parser.add_argument(
+            "-o", "--output_prefix",
+            help="Output filename prefixes to write to, if omitted, output will be disabled")
+        self._parser.add_argument(
+            "-t", "--output_types",
+            choices=["stl", "step", "combined_step"],
+            default="stl",
+            help="Type of output files to write")
+        self._parser.add_argument(
+            "-C", "--no_custom_saves",
+            default=False, action="store_true",
+            help="Disable custom saves as defined by children assemblies")
+    @property
+    def output_is_set(self):
+        return not self._args.output_prefix is None
+
+    def remake_children_with_args(self, args):
+        self.remake_with_args(args)
+        return dict((k, v) for v, k in self._obj.children_specs)
+
+    def save_output(self):
+        from build123d import exporters3d
+        out_type = self._args.output_types
+        prefix = self._args.output_prefix
+        # List of (name, func, args) to run for saving
+        tasks = []
+        if not self._args.no_custom_saves:
+            for (obj, name) in self.make().children_specs:
+                if hasattr(obj, "custom_save_func") and not (obj.custom_save_func is None):
+                    tasks.append((f"{name} (custom save)", obj.custom_save_func,
+                                  (obj, f"{prefix}_{name}")))
+        if out_type == "combined_step":
+            tasks.append(("combined", exporters3d.export_step,
+                          (self.make(), f"{prefix}.step")))
+        else:
+            if not hasattr(exporters3d, f"export_{out_type}"):
+                raise ValueError("Unknown output file type")
+            export_func = getattr(exporters3d, f"export_{out_type}")
+            names = [name for (obj, name) in self.make().children_specs
+                     if name is not None]
+            if len(set(names)) != len(names):
+                raise ValueError(f"Duplicate children names: {names}")
+            for (obj, name) in self.make().children_specs:
+                if name is None:
+                    continue
+                tasks.append((name, export_func,
+                              (obj, f"{prefix}_{name}.{out_type}")))
+        run_save_tasks(tasks, self._args.jobs)
+
+
+_BASIC_TYPES = {"int": int, "float": float, "str": str}
+
+
+def library_source_digest() -> str:
+    """Digest of all .py files under lib/"""
+    h = hashlib.sha256()
+    lib_dir = os.path.dirname(os.path.abspath(__file__))
+    for root, dirs, files in os.walk(lib_dir):
+        dirs.sort()
+        for fn in sorted(files):
+            if fn.endswith(".py"):
+                with open(os.path.join(root, fn), "rb") as f:
+                    h.update(f.read())
+    return h.hexdigest()
+
+
+def _spec_path(module_file: str) -> str:
+    d, fn = os.path.split(os.path.abspath(module_file))
+    return os.path.join(d, "__pycache__",
+                        f"{os.path.splitext(fn)[0]}.cli-spec.json")
+
+
+def _spec_digest(module_file: str) -> str:
+    h = hashlib.sha256(library_source_digest().encode())
+    with open(module_file, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def _action_spec(action) -> Dict[str, Any]:
+    """JSON representation of an argparse action, types other than basic
+    ones are dropped, which only makes parsing from the spec laxer"""
+    type_name = getattr(action.type, "__name__", None)
+    return {
+        "option_strings": action.option_strings,
+        "dest": action.dest,
+        "kind": type(action).__name__,
+        "nargs": action.nargs,
+        "default": None if action.default is None else str(action.default),
+        "type": type_name if type_name in _BASIC_TYPES else None,
+        "choices": [str(c) for c in action.choices]
+        if action.choices and type_name in _BASIC_TYPES else None,
+        "required": action.required,
+        "help": action.help,
+    }
+
+
+def _parser_from_spec(prog: str, spec: List[Dict[str, Any]]) -> ArgumentParser:
+    parser = ArgumentParser(prog=prog,
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    for a in spec:
+        if a["kind"] == "_HelpAction":
+            continue
+        kwargs = {"help": a["help"], "default": a["default"]}
+        if a["option_strings"]:
+            kwargs["dest"] = a["dest"]
+            kwargs["required"] = a["required"]
+        if a["kind"] in ("_StoreTrueAction", "_StoreFalseAction"):
+            kwargs["action"] = "store_true" if a["kind"] == "_StoreTrueAction" \
+                else "store_false"
+        else:
+            kwargs["nargs"] = a["nargs"]
+            kwargs["type"] = _BASIC_TYPES.get(a["type"])
+            kwargs["choices"] = a["choices"]
+        parser.add_argument(*(a["option_strings"] or [a["dest"]]), **kwargs)
+    return parser
+
+
+def fast_help(module_name: str, module_file: str):
+    """Call at the top of a design file, before importing build123d.
+    When the file is run as a script and its argument spec is cached from
+    an earlier run, --help and argument errors are answered from the spec,
+    exiting without loading the geometry kernel"""
+    if module_name != "__main__":
+        return
+    try:
+        with open(_spec_path(module_file)) as f:
+            cached = json.load(f)
+        if cached["digest"] != _spec_digest(module_file):
+            return
+    except (OSError, ValueError, KeyError):
+        return
+    parser = _parser_from_spec(os.path.basename(module_file), cached["spec"])
+    parser.parse_args(cached["args"] + sys.argv[1:])
@@ -1,8 +1,11 @@
 # 3D printed snap clip for board-like objects
 
 import cad_common
+from cad_cli import fast_help
+fast_help(__name__, __file__)
 from build123d import *
 from bd_common import *
+import bd_trace
 import math
 
 from dataclasses import dataclass
@@ -12,6 +15,7 @@ class BoardSnapClip(CommonPart):
     length: float = 10
     depth: float = 1
     snap_tolerance: float = 0
+    cacheable = True
     def init_params(self):
         self.width = math.sqrt(2)*self.depth
         self.full_length = self.length + 2*self.depth
@@ -27,6 +31,8 @@ class BoardSnapClip(CommonPart):
         main = main + [back_wedge, front_wedge]
         main = Rot(Y=180) * main
         return main
+    @bd_trace.traced()
+    @shared_method
     def make_negative(self):
         if self.snap_tolerance == 0:
             return Rot(Y=180) * self.main_part
@@ -38,4 +44,4 @@ class BoardSnapClip(CommonPart):
 cli = CommonPartCLI(BoardSnapClip)
 make_default_model = cli.remake_with_args
 if __name__ == "__main__":
-    cli.main()
+    cli.main(__name__)
@@ -1 +1,2 @@
-from .BoardSnapClip import BoardSnapClip
\ No newline at end of file
+from utils import lazy_package
+lazy_package(__name__, ("BoardSnapClip",))
@@ -1,7 +1,10 @@
 # Enclosure for a board, secured by snap clips
 import cad_common
+from cad_cli import fast_help
+fast_help(__name__, __file__)
 from build123d import *
 from bd_common import *
+from bd_index import face_index
 
 from dataclasses import dataclass, make_dataclass, fields
 
@@ -12,14 +15,13 @@ class _UnAssembled(SnapClipBoardStandoff):
     top_clearance: float = 3
     top_inset_amount: float = 2
     lid_tolerance: float = 0
+    cached_attrs = ("main_part", "base", "lid")
     def init_params(self):
         super().init_params()
         self.wall_h = self.board_thickness + max(self.top_clearance, 2*self.snap.width) + self.bot_clearance
 
     def make(self):
-        super().make()
-        # Unmangle
-        last_components = getattr(self, f"_{self.__class__.__base__.__name__}__components")
+        last_components = self.make_components()
         def make_next_step(left_attach_face, left_attach_plane,
                 right_attach_face, right_attach_plane,
                 main, main_w_snaps,
@@ -27,21 +29,22 @@ class _UnAssembled(SnapClipBoardStandoff):
             **kwargs):
             slot = self.snap.make_negative()
             left_slots = (
-                left_attach_plane * Pos(Y=self.snap_distance/2) * slot +
-                left_attach_plane * Pos(Y=-self.snap_distance/2) * slot
+                place(slot, left_attach_plane * Pos(Y=self.snap_distance/2)) +
+                place(slot, left_attach_plane * Pos(Y=-self.snap_distance/2))
             )
             left_slots = connect_to(left_slots, left_attach_face, TOP+RIGHT, TOP)
             right_slots = (
-                right_attach_plane * Pos(Y=self.snap_distance/2) * slot +
-                right_attach_plane * Pos(Y=-self.snap_distance/2) * slot
+                place(slot, right_attach_plane * Pos(Y=self.snap_distance/2)) +
+                place(slot, right_attach_plane * Pos(Y=-self.snap_distance/2))
             )
             right_slots = connect_to(right_slots, right_attach_face, TOP+LEFT, TOP)
-            back_attach_face = main.faces().filter_by(Axis.Y).sort_by(Axis.Y)[-2]
+            y_faces = face_index(main).along(Axis.Y)
+            back_attach_face = y_faces[-2]
             back_attach_plane = Plane(back_attach_face, x_dir=(0, 0, -1))
-            back_slot = connect_to(back_attach_plane*slot, back_attach_face, TOP+FRONT, TOP)
-            front_attach_face = main.faces().filter_by(Axis.Y).sort_by(Axis.Y)[1]
+            back_slot = connect_to(place(slot, back_attach_plane), back_attach_face, TOP+FRONT, TOP)
+            front_attach_face = y_faces[1]
             front_attach_plane = Plane(front_attach_face, x_dir=(0, 0, -1))
-            front_slot = connect_to(front_attach_plane*slot, front_attach_face, TOP+BACK, TOP)
+            front_slot = connect_to(place(slot, front_attach_plane), front_attach_face, TOP+BACK, TOP)
             main_w_snaps -= [left_slots, right_slots, back_slot, front_slot]
 
             lid = extrude(base_sk, self.shell_thickness)
@@ -50,27 +53,28 @@ class _UnAssembled(SnapClipBoardStandoff):
                 offset(inner_base_sk, -self.top_inset_amount)
                 )
             lid_wedge = extrude(lid_wedge_sk, -self.snap.width)
-            lid_left_attach_face = lid_wedge.faces().filter_by(Axis.X).sort_by(Axis.X)[0]
+            lid_wedge_faces = face_index(lid_wedge)
+            lid_left_attach_face = lid_wedge_faces.along(Axis.X)[0]
             lid_left_attach_plane = Plane(lid_left_attach_face, x_dir=(0, 0, -1))
             lid_left_snaps = (
-                lid_left_attach_plane * Pos(Y=self.snap_distance/2) * self.snap + 
-                lid_left_attach_plane * Pos(Y=-self.snap_distance/2) * self.snap
+                place(self.snap, lid_left_attach_plane * Pos(Y=self.snap_distance/2)) + 
+                place(self.snap, lid_left_attach_plane * Pos(Y=-self.snap_distance/2))
             )
-            lid_right_attach_face = lid_wedge.faces().filter_by(Axis.X).sort_by(Axis.X)[-1]
+            lid_right_attach_face = lid_wedge_faces.along(Axis.X)[-1]
             lid_right_attach_plane = Plane(lid_right_attach_face, x_dir=(0, 0, -1))
             lid_right_snaps = (
-                lid_right_attach_plane * Pos(Y=self.snap_distance/2) * self.snap + 
-                lid_right_attach_plane * Pos(Y=-self.snap_distance/2) * self.snap
+                place(self.snap, lid_right_attach_plane * Pos(Y=self.snap_distance/2)) + 
+                place(self.snap, lid_right_attach_plane * Pos(Y=-self.snap_distance/2))
             )
-            lid_front_attach_face = lid_wedge.faces().filter_by(Axis.Y).sort_by(Axis.Y)[0]
+            lid_front_attach_face = lid_wedge_faces.along(Axis.Y)[0]
             lid_front_attach_plane = Plane(lid_front_attach_face, x_dir=(0, 0, -1))
             lid_front_snaps = (
-                lid_front_attach_plane * self.snap
+                place(self.snap, lid_front_attach_plane)
             )
-            lid_back_attach_face = lid_wedge.faces().filter_by(Axis.Y).sort_by(Axis.Y)[-1]
+            lid_back_attach_face = lid_wedge_faces.along(Axis.Y)[-1]
             lid_back_attach_plane = Plane(lid_back_attach_face, x_dir=(0, 0, -1))
             lid_back_snaps = (
-                lid_back_attach_plane * self.snap
+                place(self.snap, lid_back_attach_plane)
             )
             if self.fillet > 0:
                 lid_face = lid.faces().filter_by(Axis.Z).sort_by(Axis.Z)[-1]
@@ -98,4 +102,4 @@ SnapClipBoardEnclosure = make_dataclass(
 cli = CommonAssemblyCLI(SnapClipBoardEnclosure)
 make_default_model = cli.remake_with_args
 if __name__ == "__main__":
-    cli.main()
\ No newline at end of file
+    cli.main(__name__)
\ No newline at end of file
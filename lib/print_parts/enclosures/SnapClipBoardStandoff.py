@@ -1,6 +1,9 @@
 import cad_common
+from cad_cli import fast_help
+fast_help(__name__, __file__)
 from build123d import *
 from bd_common import *
+from bd_index import face_index
 
 from dataclasses import dataclass
 from ..BoardSnapClip import BoardSnapClip
@@ -21,19 +24,21 @@ class SnapClipBoardStandoff(CommonPart):
     snap_depth: float = 1
     snap_tolerance: float = 0
     fillet: float = 0.6
+    cacheable = True
     def init_params(self):
         self.adjusted_inner_w = self.inner_w + 2*self.board_tolerance
         self.adjusted_inner_l = self.inner_l + 2*self.board_tolerance
         self.outer_w = self.adjusted_inner_w + 2*self.shell_thickness
         self.outer_l = self.adjusted_inner_l + 2*self.shell_thickness
-        self.snap = BoardSnapClip(length=self.snap_length,
+        self.snap = shared_instance(BoardSnapClip, length=self.snap_length,
                             depth=self.snap_depth,
                             snap_tolerance=self.snap_tolerance)
         self.wall_h = self.board_thickness + self.snap.width + self.bot_clearance
         self.snap_distance = self.snap.full_length*3
         assert self.adjusted_inner_l > self.snap.full_length * 4, "snap_length is too big!"
 
-    def make(self):
+    def make_components(self):
+        """Locals of making the standoff, for subclasses to build on"""
         inner_base_sk = Rectangle(self.adjusted_inner_w, self.adjusted_inner_l)
         base_sk = offset(inner_base_sk, self.shell_thickness)
         walls_sk = base_sk - inner_base_sk
@@ -46,26 +51,27 @@ class SnapClipBoardStandoff(CommonPart):
             bot_standoff_sk = self.bot_standoff_pattern
         bot_standoff = extrude(bot_standoff_sk, self.bot_clearance)
         main = base + [walls, bot_standoff]
-        left_attach_face = main.faces().filter_by(Axis.X).sort_by(Axis.X)[1]
+        x_faces = face_index(main).along(Axis.X)
+        left_attach_face = x_faces[1]
         left_attach_plane = Plane(left_attach_face, x_dir=(0, 0, -1))
-        left_snap = left_attach_plane * self.snap
+        left_snap = place(self.snap, left_attach_plane)
         left_snap = connect_to(left_snap, left_attach_face, LEFT+BOT, BOT)
-        left_snap = Pos(Z=self.board_thickness)*left_snap
-        right_attach_face = main.faces().filter_by(Axis.X).sort_by(Axis.X)[-2]
+        left_snap = place(left_snap, Pos(Z=self.board_thickness))
+        right_attach_face = x_faces[-2]
         right_attach_plane = Plane(right_attach_face, x_dir=(0, 0, -1))
-        right_snap = right_attach_plane * self.snap
+        right_snap = place(self.snap, right_attach_plane)
         right_snap = connect_to(right_snap, right_attach_face, RIGHT+BOT, BOT)
-        right_snap = Pos(Z=self.board_thickness)*right_snap
+        right_snap = place(right_snap, Pos(Z=self.board_thickness))
         if self.fillet > 0:
             main_edges = main.edges().group_by(Axis.Z)[0]
             main = fillet(main_edges, self.fillet)
         main_w_snaps = main + [left_snap, right_snap]
+        return locals()
 
-        self.__components = locals()
-
-        return main_w_snaps
+    def make(self):
+        return self.make_components()["main_w_snaps"]
 
 cli = CommonPartCLI(SnapClipBoardStandoff)
 make_default_model = cli.remake_with_args
 if __name__ == "__main__":
-    cli.main()
\ No newline at end of file
+    cli.main(__name__)
\ No newline at end of file
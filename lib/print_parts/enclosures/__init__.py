@@ -1,2 +1,2 @@
-from .SnapClipBoardEnclosure import SnapClipBoardEnclosure
-from .SnapClipBoardStandoff import SnapClipBoardStandoff
\ No newline at end of file
+from utils import lazy_package
+lazy_package(__name__, ("SnapClipBoardEnclosure", "SnapClipBoardStandoff"))
@@ -2,6 +2,7 @@ import importlib.util
 import sys
 import os
 import inspect
+import types
 
 # Import hacks to avoid managing via python packages
 
@@ -23,3 +24,32 @@ def import_from_file(file_path, member=None):
         return getattr(module, member)
     else:
         return module
+
+
+class _LazyPackage(types.ModuleType):
+    """Package exporting the classes of its same-named modules, see
+    lazy_package"""
+
+    def __getattr__(self, name):
+        if name in self.__dict__.get("_lazy_parts", ()):
+            importlib.import_module(f"{self.__name__}.{name}")
+            return self.__dict__[name]
+        raise AttributeError(
+            f"module {self.__name__!r} has no attribute {name!r}")
+
+    def __setattr__(self, name, value):
+        # Importing a module binds it to the package, bind its class
+        if name in self.__dict__.get("_lazy_parts", ()) and \
+                isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+def lazy_package(name, parts):
+    """Make package name export the class of each module in parts, e.g.
+    print_parts.BoardSnapClip.BoardSnapClip as print_parts.BoardSnapClip,
+    importing the module on first use. Running one of them with -m then
+    does not import its siblings, and build123d, before fast_help runs"""
+    package = sys.modules[name]
+    package._lazy_parts = tuple(parts)
+    package.__class__ = _LazyPackage
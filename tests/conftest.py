@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for d in ("lib", "designs"):
+    sys.path.insert(0, os.path.join(ROOT_DIR, d))
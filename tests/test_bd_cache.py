@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+
+import pytest
+from build123d import Box
+
+import bd_cache
+from bd_common import CommonPart
+
+
+@dataclass(kw_only=True)
+class CachedBox(CommonPart):
+    size: float = 2
+    cacheable = True
+
+    def make(self):
+        return Box(self.size, self.size, self.size)
+
+
+@dataclass(kw_only=True)
+class LeakyBox(CachedBox):
+    def make(self):
+        self.inner = Box(1, 1, 1)
+        return super().make()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    yield bd_cache.set_geometry_cache(str(tmp_path))
+    bd_cache.set_geometry_cache(None)
+
+
+def test_cache_hit(cache):
+    volume = CachedBox(size=3).volume
+    assert CachedBox(size=3).volume == pytest.approx(volume)
+    assert cache.stats()["hits"] == 1
+
+
+def test_make_setting_other_attributes_is_not_cached(cache):
+    with pytest.warns(UserWarning, match="inner"):
+        LeakyBox()
+        assert LeakyBox().inner.volume == pytest.approx(1)
+    assert cache.stats()["entries"] == 0
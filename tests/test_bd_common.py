@@ -0,0 +1,65 @@
+import math
+from dataclasses import dataclass
+
+from build123d import Box, Circle, Compound, Part, Pos, Rectangle, Sketch
+from OCP.TopAbs import TopAbs_COMPOUND
+
+from bd_common import (CENTER, CommonJoinedPart, anchor, cut_all, cut_tools,
+                       fuse_all, instance_compound, place)
+
+
+def test_place_solids_can_be_added():
+    solid = Part(Box(1, 1, 1).solid().wrapped)
+    assert solid.wrapped.ShapeType() != TopAbs_COMPOUND
+    joined = place(solid, Pos(X=2)) + place(solid, Pos(X=-2))
+    assert abs(joined.volume - 2) < 1e-6
+
+
+def test_place_faces_are_sketches():
+    face = Sketch(Rectangle(1, 2).face().wrapped)
+    placed = place(face, Pos(Y=3))
+    assert isinstance(placed, Sketch)
+    assert placed.wrapped.ShapeType() == TopAbs_COMPOUND
+    assert abs(placed.area - 2) < 1e-6
+
+
+def test_instance_compound_of_solid():
+    solid = Part(Box(1, 1, 1).solid().wrapped)
+    instances = instance_compound(solid, [Pos(X=x) for x in (0, 2, 4)])
+    assert isinstance(instances, Part)
+    assert len(instances.solids()) == 3
+
+
+def test_anchor_keeps_children():
+    assembly = Compound(children=[Box(1, 1, 1), Pos(X=3) * Box(1, 1, 1)])
+    moved = anchor(assembly, CENTER)
+    assert len(moved.children) == 2
+
+
+def test_join_keeps_single_positive_part():
+    box = Box(1, 2, 3)
+    wrapped = box.wrapped
+
+    @dataclass(kw_only=True)
+    class Single(CommonJoinedPart):
+        def make(self):
+            return [box], []
+
+    part = Single()
+    assert box.wrapped is wrapped
+    assert abs(part.volume - 6) < 1e-6
+
+
+def test_fuse_and_cut_all():
+    boxes = [Pos(X=x) * Box(2, 2, 2) for x in (0, 1, 2)]
+    fused = fuse_all(boxes)
+    assert abs(fused.volume - 16) < 1e-6
+    cut = cut_all(fused, [Pos(X=x) * Box(1, 1, 4) for x in (0, 2)])
+    assert abs(cut.volume - 12) < 1e-6
+
+
+def test_cut_tools_sketch():
+    holes = instance_compound(Circle(1), [Pos(X=x) for x in (-3, 0, 3)])
+    cut = cut_tools(Rectangle(10, 4), holes)
+    assert isinstance(cut, Sketch)
+    assert abs(cut.area - (40 - 3 * math.pi)) < 1e-6
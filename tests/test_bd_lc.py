@@ -0,0 +1,24 @@
+from build123d import Box, Part
+from OCP.TopAbs import TopAbs_COMPOUND
+
+import bd_lc
+
+
+def test_assembly_builds():
+    assembly = bd_lc.test()
+    boards = assembly.children
+    assert len(boards) == 4
+    for board in boards:
+        assert board.wrapped.ShapeType() == TopAbs_COMPOUND
+        assert board.volume > 0
+
+
+def test_wrap_shares_attributes():
+    board = bd_lc.test().children[0]
+    wrapped = board.wrap(Part(Box(1, 2, 3).wrapped))
+    assert wrapped.wrapped.ShapeType() == TopAbs_COMPOUND
+    assert wrapped.unjoined_board is board.unjoined_board
+    assert wrapped.board_ops == board.board_ops
+    assert wrapped.board_ops is not board.board_ops
+    assert wrapped.parent is None
+    assert abs(wrapped.volume - 6) < 1e-6
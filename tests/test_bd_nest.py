@@ -0,0 +1,27 @@
+import numpy as np
+from build123d import Rectangle
+
+from bd_nest import _integral, _may_fit, nest_boards
+
+
+def test_may_fit_needs_free_window():
+    # Half of the cells are free, but no 2 x 2 window is
+    occupancy = np.indices((10, 10)).sum(axis=0) % 2 == 0
+    integral = _integral(occupancy)
+    box = np.ones((2, 2), dtype=bool)
+    assert not _may_fit(integral, [box], True)
+    assert _may_fit(integral, [np.ones((1, 1), dtype=bool)], True)
+    # An L shaped mask fits where only its empty corner is occupied
+    occupancy = np.zeros((2, 2), dtype=bool)
+    occupancy[1, 1] = True
+    corner = np.ones((2, 2), dtype=bool)
+    corner[1, 1] = False
+    assert not _may_fit(_integral(occupancy), [box], True)
+    assert _may_fit(_integral(occupancy), [corner], False)
+
+
+def test_nest_boards():
+    # Four boards fit on a sheet, the last one skips the full first sheet
+    boards = [Rectangle(40, 40) for _ in range(6)]
+    sheets = nest_boards(boards, 100, 100, spacing=2)
+    assert [len(s.boards) for s in sheets] == [4, 2]
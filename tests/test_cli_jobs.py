@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Saved by a fresh process, where no thread pool is running yet, so that
+# -j 2 actually forks, see cad_cli.map_forked
+SCRIPT = '''
+from dataclasses import dataclass
+from build123d import Box, Cylinder
+from bd_common import CommonAssembly
+from cad_cli import CommonAssemblyCLI
+
+
+@dataclass
+class TwoParts(CommonAssembly):
+    size: float = 10
+
+    def make(self):
+        return [(Box(self.size, 2, 3), "box"),
+                (Cylinder(self.size / 2, 4), "cylinder")]
+
+
+CommonAssemblyCLI(TwoParts).main()
+'''
+
+
+def _save(tmp_path, jobs):
+    out = tmp_path / f"j{jobs}"
+    out.mkdir()
+    script = tmp_path / "two_parts.py"
+    script.write_text(SCRIPT)
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "lib"))
+    result = subprocess.run([sys.executable, str(script),
+                             "-o", str(out / "two"), "-j", str(jobs)],
+                            cwd=tmp_path, env=env, check=True,
+                            capture_output=True, text=True)
+    assert "serially" not in result.stderr
+    return {fn: (out / fn).read_bytes() for fn in sorted(os.listdir(out))}
+
+
+def test_parallel_save_matches_serial(tmp_path):
+    serial = _save(tmp_path, 1)
+    assert list(serial) == ["two_box.stl", "two_cylinder.stl"]
+    assert _save(tmp_path, 2) == serial
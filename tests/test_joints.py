@@ -0,0 +1,36 @@
+import re
+
+import pytest
+from build123d import Axis, Box, Plane, Pos, Rot, section
+
+from bd_common import StraightFingerJoint, save_svg
+
+FINGER_COUNT = 8
+
+
+def _svg_paths(fn):
+    with open(fn) as f:
+        return sorted(re.findall(r' d="([^"]*)"', f.read()))
+
+
+def _join(batched):
+    length = 20.0 * FINGER_COUNT
+    base = Box(length, 50, 3)
+    target = Pos(Y=-25 - 1.5) * Rot(X=90) * Box(length, 30, 3)
+    joint = StraightFingerJoint(length / (FINGER_COUNT * 2), 3, 3, 0.1, 0.1)
+    plane = Plane(base.faces().sort_by(Axis.Y).first, x_dir=(1, 0, 0))
+    return joint.join(base, target, plane, FINGER_COUNT, spread=length,
+                      batched=batched)
+
+
+@pytest.mark.parametrize("side", [0, 1])
+def test_batched_join_svg_matches(tmp_path, side):
+    # Sections through the fingers of the male and the female board
+    plane = Plane.XY if side == 0 else Plane.XZ.offset(26.5)
+    paths = []
+    for batched in (False, True):
+        fn = str(tmp_path / f"{batched}.svg")
+        save_svg(section(_join(batched)[side], plane), fn)
+        paths.append(_svg_paths(fn))
+    assert paths[0]
+    assert paths[0] == paths[1]
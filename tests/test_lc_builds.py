@@ -0,0 +1,49 @@
+import pytest
+from build123d import Rectangle
+
+from bd_common import section_board
+from bd_lc import LCBuilder, LCConnect
+
+
+def _build(native_2d=False, first_sk=Rectangle(20, 30)):
+    # Boards of bd_lc.test()
+    builder = LCBuilder(default_connect_type=LCConnect.FROM_BASE,
+                        native_2d=native_2d)
+    b1 = builder.add_board(first_sk)
+    builder.add_board(Rectangle(40, 30), angle=180, flip=True)
+    builder.add_board(Rectangle(10, 30), offset=(0, 0, -5))
+    builder.add_board(Rectangle(30, 20), angle=270, offset=(-10, 0, 0),
+                      connect_type=LCConnect.TO_BASE, base_board=b1)
+    return builder, b1
+
+
+def _plain():
+    return _build()[0].make_assembly()
+
+
+def _rebuilt():
+    builder, b1 = _build(first_sk=Rectangle(24, 30))
+    builder.make_assembly()
+    builder.update_board(b1, sk=Rectangle(20, 30))
+    builder.rebuild()
+    return builder.make_assembly()
+
+
+def _native_2d():
+    return _build(native_2d=True)[0].make_assembly()
+
+
+@pytest.fixture(scope="module")
+def plain():
+    return _plain()
+
+
+@pytest.mark.parametrize("make", [_rebuilt, _native_2d])
+def test_builds_match(plain, make):
+    other = make()
+    assert len(other.children) == len(plain.children) == 4
+    for a, b in zip(plain.children, other.children):
+        assert a.volume == pytest.approx(b.volume, rel=1e-6)
+        sa, sb = section_board(a), section_board(b)
+        assert sa.area == pytest.approx(sb.area, rel=1e-6)
+        assert len(sa.edges()) == len(sb.edges())
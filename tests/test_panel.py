@@ -0,0 +1,49 @@
+import os
+import re
+
+import pytest
+from build123d import ExportSVG, Unit, import_svg
+
+from bd_flat import flat_profile
+from utils import import_from_file
+
+PANEL_FILE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "designs", "Rack", "Panel.py")
+Panel = import_from_file(PANEL_FILE)
+
+
+def _svg_attrs(fn):
+    with open(fn) as f:
+        text = f.read()
+    return [re.search(f'{name}="([^"]*)"', text).group(1)
+            for name in ("width", "height", "viewBox", "stroke-width")]
+
+
+def _svg_loops(fn):
+    """Length and bounds of every closed path, in any order"""
+    return sorted(
+        (round(w.length, 3),) +
+        tuple(round(v, 3) for v in (*w.bounding_box().min,
+                                    *w.bounding_box().max))
+        for w in import_svg(fn))
+
+
+@pytest.mark.parametrize("cls, params", [
+    ("ModularPanel", {}),
+    ("ModularPanel", {"widthU": 3, "heightU": 2}),
+    ("RackPanel", {"widthIn": 8, "holeD": 3, "holeW": 6}),
+])
+def test_profile_svg_matches_sketch(tmp_path, cls, params):
+    cls = getattr(Panel, cls)
+    profile = flat_profile(cls, **params)
+    assert profile is not None
+    fast = str(tmp_path / "fast.svg")
+    profile.write(fast)
+    # As written by Panel.py with --no_fast_path
+    built = str(tmp_path / "built.svg")
+    exporter = ExportSVG(unit=Unit.MM, line_weight=0.5)
+    exporter.add_layer("Layer 1", line_color=(0, 0, 0))
+    exporter.add_shape(cls(**params), layer="Layer 1")
+    exporter.write(built)
+    assert _svg_attrs(fast) == _svg_attrs(built)
+    assert _svg_loops(fast) == _svg_loops(built)